@@ -5,290 +5,754 @@ Optimized for fast responses and proper group behavior
 """
 
 import asyncio
-import json
 import logging
-import os
+import queue
+import signal
 import time
-from datetime import datetime
-from typing import Dict, Optional, Set
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional, Set, Tuple
+
+BOOT_STARTED = time.monotonic()  # Cold-start clock, taken before the heavy imports
 
 import aiohttp
 from telegram import Update, User, Message, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.constants import ChatAction, ParseMode
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import (
-    Application, CommandHandler, MessageHandler, 
+    Application, ApplicationHandlerStop, CommandHandler, MessageHandler, TypeHandler,
     ContextTypes, filters
 )
 
 # Import configuration
 from config import (
     BOT_TOKEN, OWNER_ID, OWNER_IDS, BOT_NAMES,
-    API_KEY, API_ENDPOINT, MODEL, AI_PERSONALITY_PROMPT,
-    MEMORY_ENABLED, MEMORY_FILE, CONVERSATION_LOG,
+    MODEL, AI_PERSONALITY_PROMPT,
+    API_UPSTREAMS, ROUTING_EWMA_ALPHA, ROUTING_ERROR_PENALTY, SMALL_TALK_MAX_CHARS, HELP_KEYWORDS,
+    MEMORY_ENABLED, MEMORY_FLUSH_INTERVAL, MEMORY_PRELOAD_USERS, MEMORY_HOT_MAX_USERS, MEMORY_IDLE_EVICT_SECONDS,
+    CONVERSATION_LOG,
+    CONVERSATION_LOG_QUEUE_SIZE, CONVERSATION_LOG_BATCH_SIZE, CONVERSATION_LOG_FLUSH_INTERVAL,
+    CONVERSATION_LOG_ROTATE_BYTES, CONVERSATION_LOG_ROTATE_SECONDS, CONVERSATION_LOG_COMPRESS,
+    CONVERSATION_LOG_DROP_POLICY,
+    CONCURRENT_UPDATES, PER_USER_MAX_IN_FLIGHT, CHAT_QUEUE_LIMIT,
+    RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_CANDIDATES, RESPONSE_CACHE_MAX_MESSAGE_CHARS, RESPONSE_CACHE_CONTEXT_MESSAGES,
+    RATE_LIMIT_USER_RATE, RATE_LIMIT_USER_BURST, RATE_LIMIT_CHAT_RATE, RATE_LIMIT_CHAT_BURST,
+    RATE_LIMIT_GLOBAL_RATE, RATE_LIMIT_GLOBAL_BURST, RATE_LIMIT_IDLE_TTL, COALESCE_WINDOW, COALESCE_MAX_BATCH,
+    METRICS_HOST, METRICS_PORT,
+    CONTEXT_TOKEN_BUDGET, CONTEXT_HISTORY_MAX, CONTEXT_FOLD_BATCH,
+    CONTEXT_SUMMARY_MAX_TOKENS, CONTEXT_SUMMARY_CLIP_CHARS, CONTEXT_GROUP_MAX_TOKENS,
+    GROUP_CONTEXT_MESSAGES, GROUP_CONTEXT_MAX_CHATS, GROUP_CONTEXT_MAX_CHARS,
+    TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST, TELEGRAM_GROUP_RATE, TELEGRAM_GROUP_BURST,
+    TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_BURST, TELEGRAM_MAX_RETRIES, TELEGRAM_TYPING_TTL, MEDIA_CACHE_FILE,
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_MAX_PENDING, WEBHOOK_MAX_CONNECTIONS, WEBHOOK_REGISTER,
+    DROP_PENDING_UPDATES, STATE_FILE, STATE_CHECKPOINT_INTERVAL,
+    SHARD_COUNT, SHARD_INDEX, TELEGRAM_BASE_URL,
+    API_DEADLINE, API_MAX_ATTEMPTS, API_BACKOFF_BASE, API_BACKOFF_MAX,
+    API_HEDGE_PERCENTILE, API_HEDGE_MIN_SAMPLES, BREAKER_FAILURE_THRESHOLD, BREAKER_RECOVERY_TIMEOUT,
     DEVELOPER_URL, COMMUNITY_URL,
-    is_owner, is_bot_mentioned
+    STREAM_RESPONSES, STREAM_EDIT_INTERVAL, STREAM_MIN_EDIT_CHARS,
+    is_owner
+)
+from http_pool import PoolStats, create_session, pool_usage
+from streaming import StreamingReply, iter_chat_deltas
+from memory_store import MemoryStore, create_backend
+from user_record import Exchange, UserRecord
+from conversation_logger import ConversationLogger
+from update_processor import ChatOrderedProcessor
+from response_cache import ResponseCache
+from wake_words import WakeWordMatcher, REASON_PRIVATE, REASON_REPLY
+from resilience import (
+    CircuitOpenError, ResilientCaller, RetryPolicy,
+    UpstreamError, parse_retry_after
 )
+from upstreams import Upstream, UpstreamPool, build_upstreams, classify_tier
+from rate_limit import BurstCoalescer, RateLimiter, RequestThrottle
+from metrics import BotMetrics, Histogram, start_metrics_server
+from webhook import SECRET_TOKEN_HEADER, WebhookServer
+from context_builder import ContextBuilder
+from group_context import GroupContext
+from outbound import MediaCache, SendQueue
+from bot_state import BotState
+from sharding import worker_urls
 
-# Enhanced logging setup
+# Enhanced logging setup, records are queued and the listener thread does the file I/O
+log_queue: queue.Queue = queue.Queue()
+log_listener = QueueListener(
+    log_queue,
+    logging.FileHandler('anikah_bot.log'),
+    logging.StreamHandler()
+)
+# Sharded workers share the log file, so their lines say which shard wrote them
+LOG_SHARD = f"shard {SHARD_INDEX} - " if SHARD_COUNT > 1 else ""
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('anikah_bot.log'),
-        logging.StreamHandler()
-    ]
+    format=f'%(asctime)s - {LOG_SHARD}%(name)s - %(levelname)s - %(message)s',
+    handlers=[QueueHandler(log_queue)]
 )
+log_listener.start()
 logger = logging.getLogger(__name__)
 
+# Canned replies for when the API can't give a real answer (never cached)
+FALLBACK_API_ERROR = "ngl the AI is being weird rn, try again in a sec"
+FALLBACK_TIMEOUT = "oop API is taking forever, try again bestie"
+FALLBACK_NETWORK = "can't reach the AI rn fr, network issues"
+FALLBACK_GENERIC = "something went wrong but we're good fr, try again"
+FALLBACK_RESPONSES = {FALLBACK_API_ERROR, FALLBACK_TIMEOUT, FALLBACK_NETWORK, FALLBACK_GENERIC}
+
+# How a message ended up, used as the metrics outcome label
+OUTCOME_IGNORED = "ignored"
+OUTCOME_COALESCED = "coalesced"
+OUTCOME_THROTTLED = "throttled"
+OUTCOME_CACHED = "cached"
+OUTCOME_ANSWERED = "answered"
+OUTCOME_FALLBACK = "fallback"
+OUTCOME_ERROR = "error"
+
+
+def format_percentiles(histogram: Histogram) -> str:
+    """p50 / p95 / p99 of a latency histogram for /stats"""
+    if not histogram.count():
+        return "no data yet"
+    return " / ".join(f"{histogram.quantile(q) * 1000:.0f}ms" for q in (0.5, 0.95, 0.99)) + f" ({histogram.count()})"
+
+
 class AnikahBot:
     def __init__(self):
-        self.memory: Dict = {}
+        # Totals carry over from the last run; start_time is this process, first_start the first run
+        self.state = BotState(STATE_FILE)
+        self.state.load()
+        saved = self.state.stats
+        now = datetime.now().isoformat()
         self.conversation_stats: Dict = {
-            "total_messages": 0,
-            "api_calls": 0,
-            "errors": 0,
-            "start_time": datetime.now().isoformat()
+            "total_messages": saved.get("total_messages", 0),
+            "api_calls": saved.get("api_calls", 0),
+            "errors": saved.get("errors", 0),
+            "start_time": now,
+            "first_start": saved.get("first_start", now),
+            "previous_uptime": saved.get("uptime_seconds", 0.0)
         }
-        self.bot_username: Optional[str] = None  # Cache bot username
+        self.resume_after = self.state.last_update_id  # Updates up to here were handled before the restart
+        self.duplicates_skipped = 0
+        self.checkpoint_task: Optional[asyncio.Task] = None
+        self.init_started = time.monotonic()
+        self.ready_at: Optional[float] = None  # When updates started being taken
+        self.cold_start_seconds: Optional[float] = None
+        self.first_reply_seconds: Optional[float] = None  # Update to reply, for the first one answered
+        self.bot_username: Optional[str] = None  # Filled from get_me() during initialize()
+        self.wake_matcher = WakeWordMatcher(BOT_NAMES)  # Rebuilt once the username is known
+        self.http_session: Optional[aiohttp.ClientSession] = None  # Shared pooled session
+        self.pool_stats = PoolStats()
+        # Circuit breakers live on each upstream so a dead endpoint doesn't block the others
+        self.upstream_pool = UpstreamPool(
+            build_upstreams(API_UPSTREAMS, BREAKER_FAILURE_THRESHOLD, BREAKER_RECOVERY_TIMEOUT),
+            alpha=ROUTING_EWMA_ALPHA,
+            error_penalty=ROUTING_ERROR_PENALTY
+        )
+        self.resilience = ResilientCaller(
+            RetryPolicy(API_MAX_ATTEMPTS, API_BACKOFF_BASE, API_BACKOFF_MAX),
+            hedge_percentile=API_HEDGE_PERCENTILE,
+            hedge_min_samples=API_HEDGE_MIN_SAMPLES
+        )
+        self.memory_store: Optional[MemoryStore] = None
+        self.metrics = BotMetrics()
+        self.metrics_runner = None  # Local /metrics HTTP server, started in run()
+        self.webhook_server: Optional[WebhookServer] = None
+        self.context_builder = ContextBuilder(
+            AI_PERSONALITY_PROMPT, CONTEXT_TOKEN_BUDGET, CONTEXT_SUMMARY_MAX_TOKENS, CONTEXT_SUMMARY_CLIP_CHARS,
+            group_max_tokens=CONTEXT_GROUP_MAX_TOKENS
+        )
+        self.send_queue = SendQueue(
+            RateLimiter(TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST, RATE_LIMIT_IDLE_TTL),
+            RateLimiter(TELEGRAM_GROUP_RATE, TELEGRAM_GROUP_BURST, RATE_LIMIT_IDLE_TTL),
+            RateLimiter(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_BURST, RATE_LIMIT_IDLE_TTL),
+            TELEGRAM_MAX_RETRIES, TELEGRAM_TYPING_TTL,
+            observe=lambda method, seconds: self.metrics.telegram_seconds.observe(seconds, method=method)
+        )
+        self.media_cache = MediaCache(MEDIA_CACHE_FILE)
+        self.group_context = GroupContext(GROUP_CONTEXT_MESSAGES, GROUP_CONTEXT_MAX_CHATS, GROUP_CONTEXT_MAX_CHARS)
+        self.conversation_logger = ConversationLogger(
+            CONVERSATION_LOG,
+            max_queue=CONVERSATION_LOG_QUEUE_SIZE,
+            batch_size=CONVERSATION_LOG_BATCH_SIZE,
+            flush_interval=CONVERSATION_LOG_FLUSH_INTERVAL,
+            rotate_bytes=CONVERSATION_LOG_ROTATE_BYTES,
+            rotate_seconds=CONVERSATION_LOG_ROTATE_SECONDS,
+            compress=CONVERSATION_LOG_COMPRESS,
+            drop_policy=CONVERSATION_LOG_DROP_POLICY
+        )
+        self.response_cache: Optional[ResponseCache] = None
+        if RESPONSE_CACHE_ENABLED:
+            self.response_cache = ResponseCache(
+                ttl=RESPONSE_CACHE_TTL,
+                max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+                max_bytes=RESPONSE_CACHE_MAX_BYTES,
+                candidates=RESPONSE_CACHE_CANDIDATES,
+                max_message_chars=RESPONSE_CACHE_MAX_MESSAGE_CHARS,
+                context_messages=RESPONSE_CACHE_CONTEXT_MESSAGES
+            )
+        self.throttle = RequestThrottle(
+            RateLimiter(RATE_LIMIT_USER_RATE, RATE_LIMIT_USER_BURST, RATE_LIMIT_IDLE_TTL),
+            RateLimiter(RATE_LIMIT_CHAT_RATE, RATE_LIMIT_CHAT_BURST, RATE_LIMIT_IDLE_TTL),
+            RateLimiter(RATE_LIMIT_GLOBAL_RATE, RATE_LIMIT_GLOBAL_BURST, RATE_LIMIT_IDLE_TTL)
+        )
+        self.coalescer = BurstCoalescer(COALESCE_WINDOW, COALESCE_MAX_BATCH)
+        self.update_processor: Optional[ChatOrderedProcessor] = None
+        if CONCURRENT_UPDATES > 1:
+            self.update_processor = ChatOrderedProcessor(
+                CONCURRENT_UPDATES, PER_USER_MAX_IN_FLIGHT, CHAT_QUEUE_LIMIT,
+                on_arrival=self.note_arrival,
+                on_done=self.finish_update
+            )
+        self.register_gauges()
         self.load_memory()
 
+    def register_gauges(self) -> None:
+        """Expose live queue and pool state as gauges read at scrape time"""
+        registry = self.metrics.registry
+        registry.gauge(
+            "anikah_memory_users", "Users held in memory",
+            lambda: len(self.memory_store.hot) if self.memory_store else 0
+        )
+        registry.gauge(
+            "anikah_memory_pending_writes", "Users waiting for the next memory flush",
+            lambda: self.memory_store.pending if self.memory_store else 0
+        )
+        registry.gauge(
+            "anikah_update_queue_depth", "Updates waiting for a worker slot",
+            lambda: self.update_processor.stats()["queued"] if self.update_processor else 0
+        )
+        registry.gauge(
+            "anikah_api_pool_in_use", "Upstream HTTP connections in use",
+            lambda: pool_usage(self.http_session, self.pool_stats)["in_use"]
+        )
+        registry.gauge(
+            "anikah_conversation_log_queued", "Conversation log lines waiting to be written",
+            lambda: self.conversation_logger.queued
+        )
+        registry.gauge(
+            "anikah_cold_start_seconds", "Process start until updates were being taken",
+            lambda: self.cold_start_seconds or 0
+        )
+        registry.gauge(
+            "anikah_first_reply_seconds", "Update to reply for the first message answered",
+            lambda: self.first_reply_seconds or 0
+        )
+
     def load_memory(self) -> None:
-        """Load conversation memory from file"""
-        if MEMORY_ENABLED and os.path.exists(MEMORY_FILE):
-            try:
-                with open(MEMORY_FILE, 'r', encoding='utf-8') as f:
-                    self.memory = json.load(f)
-                logger.info(f"Loaded memory for {len(self.memory)} users")
-            except Exception as e:
-                logger.error(f"Failed to load memory: {e}")
-                self.memory = {}
+        """Open the configured memory backend, records are read later by warm_memory() or on demand"""
+        if not MEMORY_ENABLED:
+            return
+        try:
+            self.memory_store = MemoryStore(
+                create_backend(), MEMORY_FLUSH_INTERVAL, MEMORY_HOT_MAX_USERS, MEMORY_IDLE_EVICT_SECONDS,
+                on_flush=lambda seconds, rows: self.metrics.memory_save_seconds.observe(seconds)
+            )
+        except Exception as e:
+            logger.error(f"Failed to open memory, continuing without it: {e}")
 
-    def save_memory(self) -> None:
-        """Save conversation memory to file"""
-        if MEMORY_ENABLED:
+    async def warm_memory(self) -> None:
+        """Preload recently active users (and import the legacy JSON file) before updates are taken"""
+        if not self.memory_store:
+            return
+        try:
+            loaded = await self.memory_store.warm(MEMORY_PRELOAD_USERS)
+            logger.info(f"Loaded memory for {loaded} recent users ({self.memory_store.backend.name}), the rest load on demand")
+        except Exception as e:
+            # Running without memory beats overwriting what's stored with a partial view
+            logger.error(f"Failed to load memory, continuing without it: {e}")
+            self.memory_store = None
+
+    async def save_memory(self) -> None:
+        """Flush pending memory writes right away"""
+        if self.memory_store:
             try:
-                with open(MEMORY_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(self.memory, f, indent=2, ensure_ascii=False)
+                await self.memory_store.flush()
             except Exception as e:
                 logger.error(f"Failed to save memory: {e}")
 
+    async def start_http_session(self) -> None:
+        """Open the shared pooled session used for all API calls"""
+        if self.http_session is None or self.http_session.closed:
+            self.http_session = create_session(self.pool_stats)
+
+    async def close_http_session(self) -> None:
+        """Close the shared session and release pooled connections"""
+        if self.http_session and not self.http_session.closed:
+            await self.http_session.close()
+        self.http_session = None
+
     def log_conversation(self, user_id: int, username: str, message: str, response: str) -> None:
-        """Log conversation for analysis"""
-        try:
-            log_entry = {
-                "timestamp": datetime.now().isoformat(),
-                "user_id": user_id,
-                "username": username,
-                "message": message[:200],  # Truncate for privacy
-                "response": response[:200],
-                "response_length": len(response)
-            }
-            
-            with open(CONVERSATION_LOG, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(log_entry) + '\n')
-        except Exception as e:
-            logger.error(f"Failed to log conversation: {e}")
+        """Queue conversation for analysis, written in batches off the event loop"""
+        log_entry = {
+            "timestamp": datetime.now().isoformat(),
+            "user_id": user_id,
+            "username": username,
+            "message": message[:200],  # Truncate for privacy
+            "response": response[:200],
+            "response_length": len(response)
+        }
+        
+        if not self.conversation_logger.log(log_entry):
+            logger.warning("Conversation log queue full, dropped an entry")
 
-    def should_respond_in_group(self, message: Message, bot_username: str) -> bool:
+    def should_respond_in_group(self, message: Message, bot_username: str) -> Optional[str]:
         """
-        Determine if bot should respond in group chat
+        Determine if bot should respond in group chat, returns the reason or None
         Only responds when:
-        1. Bot is mentioned by name from BOT_NAMES
+        1. Bot is mentioned by name from BOT_NAMES (whole word)
         2. Bot is mentioned by @username 
         3. Message is a reply to bot's message
         """
         if message.chat.type == 'private':
-            return True
+            return REASON_PRIVATE
             
         # Check if replying to bot's message (case insensitive)
         if (message.reply_to_message and 
+            message.reply_to_message.from_user and
             message.reply_to_message.from_user.username and
             message.reply_to_message.from_user.username.lower() == bot_username.lower()):
-            return True
-            
-        # Check for @username mention (case insensitive)
-        if message.text and f"@{bot_username.lower()}" in message.text.lower():
-            return True
-            
-        # Check for bot name mentions from config
-        if message.text and is_bot_mentioned(message.text):
-            return True
+            return REASON_REPLY
             
-        return False
+        # Names and @username in one precompiled pass
+        if self.wake_matcher.bot_username != bot_username:
+            self.wake_matcher = WakeWordMatcher(BOT_NAMES, bot_username)
+        return self.wake_matcher.match(message.text)
 
-    async def get_ai_response(self, message: str, user_context: Dict) -> str:
+    def set_bot_username(self, bot_username: str) -> None:
+        """Remember the username and build the wake-word matcher for it once"""
+        self.bot_username = bot_username
+        if self.wake_matcher.bot_username != bot_username:
+            self.wake_matcher = WakeWordMatcher(BOT_NAMES, bot_username)
+        logger.info(f"Cached bot username: {self.bot_username}")
+
+    def note_arrival(self, update: object) -> None:
+        """Tell the coalescer about a message the moment it's queued, before it waits its turn"""
+        if isinstance(update, Update):
+            self.state.update_started(update.update_id)
+        if not isinstance(update, Update) or not self.bot_username or update.update_id <= self.resume_after:
+            return
+        message = update.message
+        if not message or not message.text or not message.from_user:
+            return
+        if self.should_respond_in_group(message, self.bot_username):
+            self.coalescer.note(message.chat_id, message.from_user.id, message.message_id, message.text.strip())
+
+    async def skip_seen_update(self, update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Runs before every handler: drops updates Telegram redelivers after a restart"""
+        if not isinstance(update, Update):
+            return
+        if update.update_id <= self.resume_after:
+            self.duplicates_skipped += 1
+            raise ApplicationHandlerStop
+        if not self.update_processor:
+            self.state.update_started(update.update_id)  # The processor does this on arrival instead
+
+    def finish_update(self, update: object) -> None:
+        """Only finished updates move the checkpointed offset, queued and running ones hold it back"""
+        if isinstance(update, Update):
+            self.state.update_finished(update.update_id)
+
+    async def finish_handled_update(self, update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Runs after every handler when there's no update processor to report completion"""
+        self.finish_update(update)
+
+    def checkpoint_state(self) -> None:
+        """Write the update offset and /stats totals to the state file"""
+        uptime = datetime.now() - datetime.fromisoformat(self.conversation_stats["start_time"])
+        self.state.stats = {
+            "total_messages": self.conversation_stats["total_messages"],
+            "api_calls": self.conversation_stats["api_calls"],
+            "errors": self.conversation_stats["errors"],
+            "first_start": self.conversation_stats["first_start"],
+            "uptime_seconds": self.conversation_stats["previous_uptime"] + uptime.total_seconds()
+        }
+        try:
+            self.state.save()
+        except Exception as e:
+            logger.error(f"Failed to checkpoint state: {e}")
+
+    async def _checkpoint_loop(self) -> None:
+        while True:
+            await asyncio.sleep(STATE_CHECKPOINT_INTERVAL)
+            await asyncio.to_thread(self.checkpoint_state)
+
+    def build_payload(self, message: str, user_record: Optional[UserRecord], stream: bool = False,
+                      burst: Optional[List[str]] = None, group_lines: Optional[List[str]] = None) -> Dict:
+        """Build the chat-completions request body for a message"""
+        # Group chatter, summary and as much recent history as fits the token budget,
+        # then any earlier messages from a coalesced burst and the one we're answering
+        context_messages = self.context_builder.build(message, user_record, burst, group_lines)
+        
+        return {
+            "model": MODEL,
+            "messages": context_messages,
+            "max_tokens": 150,  # Keep responses short as per personality
+            "temperature": 0.8,
+            "top_p": 0.9,
+            "stream": stream
+        }
+
+    async def _request_completion(self, payload: Dict, tier: str, tried: List[Upstream]) -> str:
+        """Single completions attempt on the best upstream not tried yet, raises UpstreamError on non-200"""
+        upstream = self.upstream_pool.pick(tier, exclude=tried)
+        tried.append(upstream)
+        await upstream.acquire()
+        start_time = time.monotonic()
+        ok: Optional[bool] = None  # Stays None if we get cancelled (lost a hedge race)
+        try:
+            async with self.http_session.post(
+                upstream.endpoint, 
+                json={**payload, "model": upstream.model}, 
+                headers=upstream.headers()
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    error = UpstreamError(
+                        response.status, f"[{upstream.name}] {error_text[:500]}",
+                        parse_retry_after(response.headers.get("Retry-After"))
+                    )
+                    ok = not error.upstream_fault
+                    raise error
+                try:
+                    data = await response.json()
+                    content = data['choices'][0]['message']['content'].strip()
+                except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+                    ok = False
+                    raise UpstreamError(502, f"[{upstream.name}] malformed response: {e!r}") from e
+                ok = True
+                return content
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            ok = False
+            raise
+        finally:
+            self._finish_attempt(upstream, ok, time.monotonic() - start_time)
+
+    def _finish_attempt(self, upstream: Upstream, ok: Optional[bool], latency: float) -> None:
+        """Free the upstream slot and record the attempt, ok is None when it was cancelled"""
+        upstream.release()
+        if ok is None:
+            upstream.abandon()  # Don't leave a half-open breaker waiting on this probe
+            return
+        upstream.record(ok, latency, self.upstream_pool.alpha)
+        self.metrics.api_seconds.observe(latency, upstream=upstream.name, outcome="ok" if ok else "error")
+
+    async def _open_stream(self, payload: Dict, tier: str,
+                           tried: List[Upstream]) -> Tuple[Upstream, aiohttp.ClientResponse, float]:
         """
-        Get AI response with improved error handling and faster API calls
+        Open a streaming response, returns the upstream, the response and the time to headers
+        The caller owns both once this returns: release the response and hand the
+        stream's outcome to _finish_attempt when the body is done
         """
+        upstream = self.upstream_pool.pick(tier, exclude=tried)
+        tried.append(upstream)
+        await upstream.acquire()
+        start_time = time.monotonic()
+        response: Optional[aiohttp.ClientResponse] = None
+        ok: Optional[bool] = None  # Stays None if we get cancelled (deadline, shutdown)
+        handed_over = False
         try:
-            # Prepare conversation context
-            recent_messages = user_context.get('recent_messages', [])
-            context_messages = [
-                {"role": "system", "content": AI_PERSONALITY_PROMPT}
-            ]
-            
-            # Add recent conversation context (last 3 messages)
-            for msg in recent_messages[-3:]:
-                context_messages.extend([
-                    {"role": "user", "content": msg.get('user', '')},
-                    {"role": "assistant", "content": msg.get('bot', '')}
-                ])
-            
-            # Add current message
-            context_messages.append({"role": "user", "content": message})
+            response = await self.http_session.post(
+                upstream.endpoint,
+                json={**payload, "model": upstream.model},
+                headers=upstream.headers()
+            )
+            if response.status != 200:
+                error_text = await response.text()
+                error = UpstreamError(
+                    response.status, f"[{upstream.name}] {error_text[:500]}",
+                    parse_retry_after(response.headers.get("Retry-After"))
+                )
+                ok = not error.upstream_fault
+                raise error
+            # Time to response headers stands in for latency on streams
+            handed_over = True
+            return upstream, response, time.monotonic() - start_time
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            ok = False
+            raise
+        finally:
+            if not handed_over:
+                if response is not None:
+                    response.release()
+                self._finish_attempt(upstream, ok, time.monotonic() - start_time)
+
+    async def get_ai_response(self, message: str, user_record: Optional[UserRecord],
+                              burst: Optional[List[str]] = None,
+                              group_lines: Optional[List[str]] = None) -> str:
+        """
+        Get AI response through the retry/backoff/circuit-breaker layer
+        """
+        try:
+            payload = self.build_payload(message, user_record, burst=burst, group_lines=group_lines)
+            tier = classify_tier(message, SMALL_TALK_MAX_CHARS, HELP_KEYWORDS)
+            tried: List[Upstream] = []  # Retries and hedges fail over to other upstreams
+            start_time = time.time()
             
-            # API request payload
-            payload = {
-                "model": MODEL,
-                "messages": context_messages,
-                "max_tokens": 150,  # Keep responses short as per personality
-                "temperature": 0.8,
-                "top_p": 0.9,
-                "stream": False  # Disable streaming for faster responses
-            }
+            # Overall deadline so a degraded upstream can't hold a reply hostage
+            ai_response = await asyncio.wait_for(
+                self.resilience.call(lambda: self._request_completion(payload, tier, tried)),
+                API_DEADLINE
+            )
+            logger.info(f"API response time: {time.time() - start_time:.2f}s ({tier} via {tried[-1].name})")
+            self.conversation_stats["api_calls"] += 1
+            return ai_response
             
-            headers = {
-                "Authorization": f"Bearer {API_KEY}",
-                "Content-Type": "application/json"
-            }
+        except CircuitOpenError:
+            logger.warning("API circuit open, answering with fallback")
+            return FALLBACK_API_ERROR
+        except UpstreamError as e:
+            logger.error(f"API Error {e.status}: {e.body}")
+            return FALLBACK_API_ERROR
+        except asyncio.TimeoutError:
+            logger.error("API request timed out")
+            return FALLBACK_TIMEOUT
+        except aiohttp.ClientError:
+            logger.error("Failed to connect to API")
+            return FALLBACK_NETWORK
+        except Exception as e:
+            logger.error(f"AI response error: {e}")
+            self.conversation_stats["errors"] += 1
+            return FALLBACK_GENERIC
+
+    async def stream_ai_reply(self, message: Message, user_message: str, user_record: Optional[UserRecord],
+                              burst: Optional[List[str]] = None,
+                              group_lines: Optional[List[str]] = None) -> Tuple[str, bool]:
+        """
+        Stream the AI response into a progressively edited reply
+        Returns the final text so memory and logs see the same thing the user does,
+        and whether the stream completed (False for a fallback or a reply cut short)
+        """
+        reply = StreamingReply(message, STREAM_EDIT_INTERVAL, STREAM_MIN_EDIT_CHARS, self.send_queue)
+        fallback = FALLBACK_GENERIC
+        complete = False
+        
+        try:
+            payload = self.build_payload(
+                user_message, user_record, stream=True, burst=burst, group_lines=group_lines
+            )
+            tier = classify_tier(user_message, SMALL_TALK_MAX_CHARS, HELP_KEYWORDS)
+            tried: List[Upstream] = []
+            start_time = time.monotonic()
             
-            # Make async API request with timeout
-            start_time = time.time()
-            timeout = aiohttp.ClientTimeout(total=50)  # 20 second timeout with retry strategy
+            # Retries and failover cover opening the stream, hedging a stream isn't worth it
+            upstream, response, latency = await asyncio.wait_for(
+                self.resilience.call(lambda: self._open_stream(payload, tier, tried), hedge=False),
+                API_DEADLINE
+            )
+            # A stream that dies partway counts against the upstream, not just its headers
+            streamed: Optional[bool] = None
+            try:
+                async for delta in iter_chat_deltas(response):
+                    await reply.push(delta)
+                streamed = True
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                streamed = False
+                raise
+            finally:
+                response.release()
+                self._finish_attempt(upstream, streamed, latency)
+            complete = bool(reply.text.strip())  # An empty stream still ends in the fallback
             
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(
-                    API_ENDPOINT, 
-                    json=payload, 
-                    headers=headers
-                ) as response:
-                    response_time = time.time() - start_time
-                    logger.info(f"API response time: {response_time:.2f}s")
-                    
-                    if response.status == 200:
-                        data = await response.json()
-                        ai_response = data['choices'][0]['message']['content'].strip()
-                        self.conversation_stats["api_calls"] += 1
-                        return ai_response
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"API Error {response.status}: {error_text}")
-                        return "ngl the AI is being weird rn, try again in a sec"
+            self.conversation_stats["api_calls"] += 1
+            first_token = (reply.first_token_at or time.monotonic()) - start_time
+            logger.info(
+                f"API stream done in {time.monotonic() - start_time:.2f}s "
+                f"(first token {first_token:.2f}s, {reply.edits} edits)"
+            )
                 
+        except CircuitOpenError:
+            logger.warning("API circuit open, answering with fallback")
+            fallback = FALLBACK_API_ERROR
+        except UpstreamError as e:
+            logger.error(f"API Error {e.status}: {e.body}")
+            fallback = FALLBACK_API_ERROR
         except asyncio.TimeoutError:
-            logger.error("API request timed out, attempting retry with shorter response")
-            # Retry once with shorter max_tokens for faster response
-            try:
-                retry_payload = payload.copy()
-                retry_payload["max_tokens"] = 50  # Much shorter for quick response
-                timeout_retry = aiohttp.ClientTimeout(total=50)
-                
-                async with aiohttp.ClientSession(timeout=timeout_retry) as session:
-                    async with session.post(API_ENDPOINT, json=retry_payload, headers=headers) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            ai_response = data['choices'][0]['message']['content'].strip()
-                            self.conversation_stats["api_calls"] += 1
-                            logger.info("Retry successful with shorter response")
-                            return ai_response
-            except Exception as retry_error:
-                logger.error(f"Retry also failed: {retry_error}")
-            
-            return "oop API is taking forever, try again bestie"
+            logger.error("API stream timed out")
+            fallback = FALLBACK_TIMEOUT
         except aiohttp.ClientError:
             logger.error("Failed to connect to API")
-            return "can't reach the AI rn fr, network issues"
+            fallback = FALLBACK_NETWORK
         except Exception as e:
-            logger.error(f"AI response error: {e}")
+            logger.error(f"AI stream error: {e}")
             self.conversation_stats["errors"] += 1
-            return "something went wrong but we're good fr, try again"
+        
+        # Keeps whatever was already streamed, fallback only if nothing arrived
+        return await reply.finish(fallback), complete
 
-    def update_user_memory(self, user_id: int, username: str, user_message: str, bot_response: str) -> None:
+    def memory_key(self, message: Message) -> str:
+        """Private chats keep the plain user id, groups get a separate memory per chat"""
+        if message.chat.type == 'private':
+            return str(message.from_user.id)
+        return f"{message.chat_id}:{message.from_user.id}"
+
+    def update_user_memory(self, user_key: str, username: str, user_message: str, bot_response: str) -> None:
         """Update user memory with conversation"""
-        if not MEMORY_ENABLED:
+        if not MEMORY_ENABLED or not self.memory_store:
             return
             
-        user_key = str(user_id)
-        if user_key not in self.memory:
-            self.memory[user_key] = {
-                "username": username,
-                "first_interaction": datetime.now().isoformat(),
-                "message_count": 0,
-                "recent_messages": []
-            }
+        # Looked up again, the record may have been evicted while we waited on the API
+        now = int(time.time())
+        record = self.memory_store.get(user_key)
+        if record is None:
+            record = UserRecord(username, first_seen=now)
+            self.memory_store.add(user_key, record)
         
         # Update user info
-        self.memory[user_key]["username"] = username
-        self.memory[user_key]["message_count"] += 1
-        self.memory[user_key]["last_interaction"] = datetime.now().isoformat()
+        record.username = username
+        record.message_count += 1
+        record.last_seen = now
         
-        # Add to recent messages (keep last 5)
-        recent = self.memory[user_key]["recent_messages"]
-        recent.append({
-            "user": user_message,
-            "bot": bot_response,
-            "timestamp": datetime.now().isoformat()
-        })
+        # Add to recent messages
+        record.recent.append(Exchange(user_message, bot_response, now))
         
-        # Keep only last 5 conversations
-        if len(recent) > 5:
-            recent.pop(0)
+        # Older conversations get folded into the rolling summary
+        self.context_builder.fold(record, CONTEXT_HISTORY_MAX, CONTEXT_FOLD_BATCH)
             
-        self.save_memory()
+        # Written by the background flusher, not inline on the event loop
+        self.memory_store.mark_dirty(user_key)
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """Handle incoming messages with improved logic"""
+        """Handle incoming messages, timing and counting every outcome"""
+        chat_type = update.effective_chat.type if update.effective_chat else "unknown"
+        start_time = time.monotonic()
+        outcome = OUTCOME_ERROR
+        self.metrics.in_flight.inc()
+        try:
+            outcome = await self._process_message(update, context)
+        finally:
+            self.metrics.in_flight.dec()
+            self.metrics.messages.inc(chat_type=chat_type, outcome=outcome)
+            if outcome != OUTCOME_IGNORED:
+                self.metrics.handle_seconds.observe(time.monotonic() - start_time, chat_type=chat_type)
+            if self.first_reply_seconds is None and outcome in (OUTCOME_ANSWERED, OUTCOME_CACHED, OUTCOME_FALLBACK):
+                self.first_reply_seconds = time.monotonic() - start_time
+                since_ready = f", {time.monotonic() - self.ready_at:.1f}s after startup" if self.ready_at else ""
+                logger.info(f"First reply took {self.first_reply_seconds:.2f}s{since_ready}")
+
+    async def _process_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> str:
+        """Handle incoming messages with improved logic, returns the outcome"""
         message = update.message
         if not message or not message.text:
-            return
+            return OUTCOME_IGNORED
             
         user = message.from_user
         user_id = user.id
         username = user.username or user.first_name or "Unknown"
         user_message = message.text.strip()
+        is_group = message.chat.type != 'private'
+        
+        # Every group message goes into the chat's ring buffer, answered or not
+        if is_group:
+            self.group_context.record(message.chat_id, message.message_id, user_id, username, user_message)
         
-        # Get cached bot username or fetch once
+        # Normally known since initialize(), fetched here only if startup was bypassed
         if not self.bot_username:
             bot_info = await context.bot.get_me()
-            self.bot_username = bot_info.username
-            logger.info(f"Cached bot username: {self.bot_username}")
+            self.set_bot_username(bot_info.username)
         
         # Check if should respond in groups
-        if not self.should_respond_in_group(message, self.bot_username):
-            return
+        reason = self.should_respond_in_group(message, self.bot_username)
+        if not reason:
+            return OUTCOME_IGNORED
+        logger.debug(f"Responding in chat {message.chat_id} ({reason})")
+        
+        # A burst of messages from this user gets one answer, from its newest message
+        batch = await self.coalescer.collect(message.chat_id, user_id, message.message_id, user_message)
+        if batch is None:
+            logger.info(f"Coalesced message from {username} ({user_id}) into a newer one")
+            return OUTCOME_COALESCED
+        burst = batch[:-1]
+        
+        throttled_scope = self.throttle.check(user_id, message.chat_id)
+        if throttled_scope:
+            logger.warning(f"Throttled message from {username} ({user_id}), {throttled_scope} limit hit")
+            return OUTCOME_THROTTLED
             
         try:
-            # Show typing indicator
-            await context.bot.send_chat_action(
-                chat_id=message.chat_id, 
-                action=ChatAction.TYPING
-            )
-            
             # Get user context for AI
-            user_context = self.memory.get(str(user_id), {})
+            user_key = self.memory_key(message)
+            user_record = self.memory_store.get(user_key) if self.memory_store else None
+            group_lines = None
+            if is_group:
+                group_lines = self.group_context.lines_before(
+                    message.chat_id, message.message_id, user_id, set(burst)
+                )
             
             # Log incoming message
             logger.info(f"Message from {username} ({user_id}): {user_message[:100]}")
             
-            # Get AI response
-            ai_response = await self.get_ai_response(user_message, user_context)
+            # Repeated greetings and wake-word pings can skip the API entirely
+            cache_key = cached_response = None
+            if self.response_cache and not burst:
+                cache_key = self.response_cache.make_key(
+                    user_message, user_record.recent if user_record else []
+                )
+                if cache_key:
+                    cached_response = self.response_cache.get(cache_key)
             
-            # Send response
-            await message.reply_text(ai_response, parse_mode=ParseMode.MARKDOWN)
+            api_start = time.monotonic()
+            if cached_response:
+                ai_response = cached_response
+                await self.send_queue.send(
+                    message.chat_id, is_group,
+                    lambda: message.reply_text(ai_response, parse_mode=ParseMode.MARKDOWN)
+                )
+            else:
+                # Show typing indicator, unless one is still showing or sends are backed up
+                await self.send_queue.send_typing(context.bot, message.chat_id, is_group)
+                
+                if STREAM_RESPONSES:
+                    # Stream tokens into the reply as they arrive
+                    ai_response, complete = await self.stream_ai_reply(
+                        message, user_message, user_record, burst, group_lines
+                    )
+                else:
+                    # Get AI response
+                    ai_response = await self.get_ai_response(user_message, user_record, burst, group_lines)
+                    complete = ai_response not in FALLBACK_RESPONSES
+                    
+                    # Send response
+                    await self.send_queue.send(
+                        message.chat_id, is_group,
+                        lambda: message.reply_text(ai_response, parse_mode=ParseMode.MARKDOWN)
+                    )
+                
+                # A fallback or a stream cut short must never be served to someone else
+                if cache_key and complete:
+                    self.response_cache.put(cache_key, ai_response, time.monotonic() - api_start)
             
             # Update memory and logs
-            self.update_user_memory(user_id, username, user_message, ai_response)
+            if burst:
+                user_message = "\n".join(batch)
+            self.update_user_memory(user_key, username, user_message, ai_response)
+            if is_group:
+                self.group_context.record(
+                    message.chat_id, message.message_id, 0, self.bot_username or "", ai_response, from_bot=True
+                )
             self.log_conversation(user_id, username, user_message, ai_response)
             self.conversation_stats["total_messages"] += 1
             
             logger.info(f"Response sent to {username}: {ai_response[:100]}")
             
+            if cached_response:
+                return OUTCOME_CACHED
+            return OUTCOME_ANSWERED if complete else OUTCOME_FALLBACK
+            
+        except RetryAfter as e:
+            # Still flood limited after retries, another message would only make it worse
+            logger.error(f"Gave up replying to {username} ({user_id}) after flood waits: {e}")
+            return OUTCOME_ERROR
         except Exception as e:
             logger.error(f"Error handling message: {e}")
             try:
-                await message.reply_text("something broke but we're vibing fr")
+                await self.send_queue.send(
+                    message.chat_id, is_group, lambda: message.reply_text("something broke but we're vibing fr")
+                )
             except:
                 pass
+            return OUTCOME_ERROR
 
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle /start command with inline keyboard"""
@@ -323,25 +787,86 @@ Born from @Rystrix creativity and @BrahMosAI community support 🌟
         try:
             # Send image with caption (placeholder for anikah.png)
             try:
-                with open('anikah.png', 'rb') as photo:
-                    await update.message.reply_photo(
-                        photo=photo,
-                        caption=welcome_message, 
+                await self.send_photo(update.message, 'anikah.png', welcome_message, reply_markup)
+            except FileNotFoundError:
+                # Fallback if image doesn't exist yet
+                await self.send_queue.send(
+                    update.message.chat_id, update.message.chat.type != 'private',
+                    lambda: update.message.reply_text(
+                        welcome_message, 
                         reply_markup=reply_markup,
                         parse_mode=ParseMode.MARKDOWN
                     )
-            except FileNotFoundError:
-                # Fallback if image doesn't exist yet
-                await update.message.reply_text(
-                    welcome_message, 
-                    reply_markup=reply_markup,
-                    parse_mode=ParseMode.MARKDOWN
                 )
             
             logger.info(f"Start command from {user.username} ({user.id})")
         except Exception as e:
             logger.error(f"Error in start command: {e}")
 
+    async def send_photo(self, message: Message, path: str, caption: str,
+                         reply_markup: InlineKeyboardMarkup) -> None:
+        """Reply with a local image, uploading it only the first time and reusing its file_id after"""
+        is_group = message.chat.type != 'private'
+        file_id = self.media_cache.get(path)
+        if file_id:
+            try:
+                await self.send_queue.send(
+                    message.chat_id, is_group,
+                    lambda: message.reply_photo(
+                        photo=file_id, caption=caption, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
+                    ),
+                    "sendPhoto"
+                )
+                return
+            except BadRequest as e:
+                logger.warning(f"Cached file_id for {path} rejected, uploading again: {e}")
+                self.media_cache.forget(path)
+
+        with open(path, 'rb') as f:
+            photo = f.read()
+        sent = await self.send_queue.send(
+            message.chat_id, is_group,
+            lambda: message.reply_photo(
+                photo=photo, caption=caption, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN
+            ),
+            "sendPhoto"
+        )
+        if sent and sent.photo:
+            self.media_cache.put(path, sent.photo[-1].file_id)
+
+    def stats_snapshot(self) -> Dict:
+        """This process's totals, fetched by whichever shard answers /stats"""
+        return {
+            "shard": SHARD_INDEX,
+            "total_messages": self.conversation_stats["total_messages"],
+            "api_calls": self.conversation_stats["api_calls"],
+            "errors": self.conversation_stats["errors"],
+            "users": len(self.memory_store.hot) if self.memory_store else 0,
+            "queued": self.update_processor.stats()["queued"] if self.update_processor else 0,
+            "sent": self.send_queue.sent,
+            "start_time": self.conversation_stats["start_time"],
+            "cold_start_seconds": self.cold_start_seconds,
+            "first_reply_seconds": self.first_reply_seconds
+        }
+
+    async def collect_shard_stats(self) -> List[Optional[Dict]]:
+        """Snapshots of every shard, None for shards that didn't answer"""
+        headers = {SECRET_TOKEN_HEADER: WEBHOOK_SECRET_TOKEN}
+
+        async def fetch(session: aiohttp.ClientSession, index: int, url: str) -> Optional[Dict]:
+            if index == SHARD_INDEX:
+                return self.stats_snapshot()
+            try:
+                async with session.get(f"{url.rstrip('/')}/stats", headers=headers) as response:
+                    response.raise_for_status()
+                    return await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Shard {index} stats unavailable: {e}")
+                return None
+
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=3)) as session:
+            return await asyncio.gather(*(fetch(session, index, url) for index, url in enumerate(worker_urls())))
+
     async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Show bot statistics (owner only)"""
         if not is_owner(update.effective_user.id):
@@ -350,14 +875,104 @@ Born from @Rystrix creativity and @BrahMosAI community support 🌟
             
         try:
             uptime = datetime.now() - datetime.fromisoformat(self.conversation_stats["start_time"])
+            total_uptime = timedelta(seconds=self.conversation_stats["previous_uptime"]) + uptime
+            pool = pool_usage(self.http_session, self.pool_stats)
             stats_text = f"""🤖 **Anikah Bot Stats**
 
-👥 **Users in memory:** {len(self.memory)}
+👥 **Users in memory:** {len(self.memory_store.hot) if self.memory_store else 0}
 💬 **Total messages:** {self.conversation_stats["total_messages"]}
 🔥 **API calls:** {self.conversation_stats["api_calls"]}
 ❌ **Errors:** {self.conversation_stats["errors"]}
-⏱️ **Uptime:** {str(uptime).split('.')[0]}
-🧠 **Model:** {MODEL}"""
+⏱️ **Uptime:** {str(uptime).split('.')[0]} (total {str(total_uptime).split('.')[0]} since {self.conversation_stats["first_start"][:10]})
+🧠 **Model:** {MODEL}
+🔌 **API pool:** {pool["in_use"]} busy / {pool["idle"]} idle (limit {pool["limit"]})
+♻️ **Connections:** {pool["connections_created"]} opened, {pool["connections_reused"]} reused"""
+            api = self.resilience.stats()
+            stats_text += (
+                f"\n🛡️ **API calls:** {api['retries']} retries, {api['hedges']} hedges ({api['hedge_wins']} won), "
+                f"{self.upstream_pool.failovers} failovers, p95 {api['p95']:.2f}s"
+            )
+            for upstream in self.upstream_pool.stats():
+                stats_text += (
+                    f"\n  • `{upstream['name']}` (`{upstream['model']}`): {upstream['state'].replace('_', '-')}, "
+                    f"{upstream['ewma_latency']:.2f}s avg, {upstream['error_rate']:.0%} errors, "
+                    f"{upstream['in_flight']} in flight, {upstream['requests']} reqs"
+                )
+            if self.memory_store:
+                stats_text += (
+                    f"\n💾 **Memory store:** {self.memory_store.backend.name}, {self.memory_store.backend.count()} stored, "
+                    f"{self.memory_store.pending} pending, {self.memory_store.rows_written} rows written, "
+                    f"{self.memory_store.cold_loads} cold loads, {self.memory_store.evictions} evicted"
+                )
+            if self.update_processor:
+                updates = self.update_processor.stats()
+                stats_text += (
+                    f"\n🚦 **Updates:** {updates['queued']} queued, {updates['in_flight']} in flight, "
+                    f"{updates['dropped']} dropped, wait avg {updates['avg_wait'] * 1000:.0f}ms / max {updates['max_wait'] * 1000:.0f}ms"
+                )
+            if self.response_cache:
+                cache = self.response_cache.stats()
+                stats_text += (
+                    f"\n⚡ **Response cache:** {cache['hit_rate']:.0%} hits ({cache['hits']}/{cache['hits'] + cache['misses']}), "
+                    f"{cache['entries']} keys, saved {cache['saved_seconds']:.1f}s of API time"
+                )
+            stats_text += (
+                f"\n⏳ **Throttled:** {self.throttle.throttled['user']} user / {self.throttle.throttled['chat']} chat / "
+                f"{self.throttle.throttled['global']} global, {self.coalescer.coalesced} coalesced"
+            )
+            outbound = self.send_queue.stats()
+            stats_text += (
+                f"\n📤 **Telegram sends:** {outbound['sent']} sent, {outbound['flood_waits']} flood waits, "
+                f"{outbound['waited']:.1f}s paced, {outbound['skipped']} skipped, {outbound['typing_deduped']} typing deduped"
+            )
+            groups = self.group_context.stats()
+            stats_text += (
+                f"\n👥 **Group context:** {groups['chats']} chats, {groups['messages']} buffered, "
+                f"{groups['evictions']} evicted"
+            )
+            if self.webhook_server:
+                webhook = self.webhook_server.stats()
+                stats_text += (
+                    f"\n🪝 **Webhook:** {webhook['accepted']} accepted, {webhook['pending']} pending, "
+                    f"{webhook['rejected']} rejected, {webhook['shed']} shed"
+                )
+            if SHARD_COUNT > 1:
+                shards = await self.collect_shard_stats()
+                up = [shard for shard in shards if shard]
+                stats_text += (
+                    f"\n🧩 **Shards:** {len(up)}/{len(shards)} up, all shards: "
+                    f"{sum(shard['total_messages'] for shard in up)} messages, "
+                    f"{sum(shard['api_calls'] for shard in up)} API calls, "
+                    f"{sum(shard['errors'] for shard in up)} errors, {sum(shard['users'] for shard in up)} users"
+                )
+                for index, shard in enumerate(shards):
+                    if not shard:
+                        stats_text += f"\n  • shard {index}: down"
+                        continue
+                    stats_text += (
+                        f"\n  • shard {index}{' (this one)' if index == SHARD_INDEX else ''}: "
+                        f"{shard['total_messages']} messages, {shard['users']} users, "
+                        f"{shard['queued']} queued, {shard['sent']} sent"
+                    )
+            if self.cold_start_seconds is not None:
+                first_reply = f"{self.first_reply_seconds:.2f}s" if self.first_reply_seconds is not None else "not yet"
+                stats_text += f"\n🚀 **Boot:** cold start {self.cold_start_seconds:.2f}s, first reply {first_reply}"
+            stats_text += (
+                f"\n🔁 **Resume:** last update {self.state.last_update_id}, "
+                f"{self.duplicates_skipped} redelivered updates skipped"
+            )
+            stats_text += "\n📈 **Latency (p50 / p95 / p99):**"
+            for label, histogram in (
+                ("handle", self.metrics.handle_seconds),
+                ("API", self.metrics.api_seconds),
+                ("Telegram send", self.metrics.telegram_seconds),
+                ("memory save", self.metrics.memory_save_seconds)
+            ):
+                stats_text += f"\n  • {label}: {format_percentiles(histogram)}"
+            stats_text += (
+                f"\n📝 **Conversation log:** {self.conversation_logger.lines_written} written, "
+                f"{self.conversation_logger.lines_dropped} dropped, {self.conversation_logger.queued} queued"
+            )
             
             await update.message.reply_text(stats_text, parse_mode=ParseMode.MARKDOWN)
         except Exception as e:
@@ -365,35 +980,116 @@ Born from @Rystrix creativity and @BrahMosAI community support 🌟
 
     def setup_application(self) -> Application:
         """Setup telegram application with handlers"""
-        application = Application.builder().token(BOT_TOKEN).build()
+        builder = Application.builder().token(BOT_TOKEN).base_url(TELEGRAM_BASE_URL)
+        if self.update_processor:
+            # Different chats run in parallel, each chat stays in order
+            builder = builder.concurrent_updates(self.update_processor)
+        if BOT_MODE == "webhook":
+            builder = builder.updater(None)  # Updates come in through WebhookServer instead
+        application = builder.build()
         
         # Add handlers
+        application.add_handler(TypeHandler(Update, self.skip_seen_update), group=-1)
         application.add_handler(CommandHandler("start", self.start_command))
         application.add_handler(CommandHandler("stats", self.stats_command))
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
+        if not self.update_processor:
+            application.add_handler(TypeHandler(Update, self.finish_handled_update), group=1)
         
         return application
 
+    async def start_webhook(self, application: Application) -> None:
+        """Serve updates over the local webhook server and register it with Telegram"""
+        self.webhook_server = WebhookServer(
+            application, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN,
+            WEBHOOK_MAX_PENDING,
+            backlog=lambda: self.update_processor.backlog if self.update_processor else 0,
+            stats_provider=self.stats_snapshot
+        )
+        await self.webhook_server.start()
+        if WEBHOOK_URL and WEBHOOK_REGISTER:
+            await application.bot.set_webhook(
+                WEBHOOK_URL,
+                secret_token=WEBHOOK_SECRET_TOKEN,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                drop_pending_updates=DROP_PENDING_UPDATES
+            )
+            logger.info(f"Webhook registered at {WEBHOOK_URL}")
+
+    async def start_metrics(self) -> None:
+        if METRICS_PORT:
+            self.metrics_runner = await start_metrics_server(self.metrics.registry, METRICS_HOST, METRICS_PORT)
+
     async def run(self) -> None:
-        """Run the bot"""
+        """Run the bot until SIGINT/SIGTERM, then shut down gracefully"""
         try:
             logger.info("Starting Anikah Bot...")
             application = self.setup_application()
+            self.conversation_logger.start()
             
-            # Start polling
-            await application.initialize()
+            # get_me() (inside initialize), the memory warm-up and the servers all overlap
+            setup_done = time.monotonic()
+            await asyncio.gather(
+                application.initialize(), self.warm_memory(), self.start_http_session(), self.start_metrics()
+            )
+            self.set_bot_username(application.bot.username)
+            if self.memory_store:
+                self.memory_store.start()
+            if STATE_CHECKPOINT_INTERVAL > 0:
+                self.checkpoint_task = asyncio.create_task(self._checkpoint_loop())
+            
+            stop_event = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.add_signal_handler(sig, stop_event.set)
+                except NotImplementedError:
+                    pass  # Windows: Ctrl+C still arrives as KeyboardInterrupt
+            
+            # Start polling; updates queued while we were down are resumed, not dropped
             await application.start()
-            await application.updater.start_polling(drop_pending_updates=True)
+            if BOT_MODE == "webhook":
+                await self.start_webhook(application)
+            else:
+                await application.updater.start_polling(drop_pending_updates=DROP_PENDING_UPDATES)
+            if self.resume_after:
+                logger.info(f"Resuming after update {self.resume_after}")
+            self.ready_at = time.monotonic()
+            self.cold_start_seconds = self.ready_at - BOOT_STARTED
+            logger.info(
+                f"Cold start: taking updates {self.cold_start_seconds:.2f}s after launch "
+                f"(imports {self.init_started - BOOT_STARTED:.2f}s, setup {setup_done - self.init_started:.2f}s, "
+                f"initialize and memory warm-up {self.ready_at - setup_done:.2f}s)"
+            )
             
             logger.info("Anikah Bot is running! Press Ctrl+C to stop.")
             
-            # Keep running until interrupted
+            # Keep running until a stop signal
             try:
-                await asyncio.Future()  # Run forever
-            except KeyboardInterrupt:
-                logger.info("Received stop signal")
+                await stop_event.wait()
+                logger.info("Received stop signal, shutting down gracefully")
             finally:
-                await application.stop()
+                started = time.monotonic()
+                # Stop taking updates first, then let everything already queued finish
+                if self.webhook_server:
+                    await self.webhook_server.stop()
+                if application.updater and application.updater.running:
+                    await application.updater.stop()
+                await application.stop()  # Drains the update queue and waits for in-flight handlers
+                await application.shutdown()
+                if self.checkpoint_task:
+                    self.checkpoint_task.cancel()
+                await self.close_http_session()
+                if self.memory_store:
+                    await self.memory_store.close()
+                await asyncio.to_thread(self.conversation_logger.close)
+                await asyncio.to_thread(self.checkpoint_state)
+                if self.metrics_runner:
+                    await self.metrics_runner.cleanup()
+                logger.info(
+                    f"Shutdown complete in {time.monotonic() - started:.1f}s, "
+                    f"last update {self.state.last_update_id} checkpointed"
+                )
                 
         except Exception as e:
             logger.error(f"Failed to start bot: {e}")
@@ -409,6 +1105,8 @@ def main():
     except Exception as e:
         logger.error(f"Bot crashed: {e}")
         raise
+    finally:
+        log_listener.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
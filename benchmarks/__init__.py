@@ -0,0 +1,6 @@
+"""
+Offline benchmarks for Anikah Bot hot paths
+Run from the repo root, e.g. python -m benchmarks.wake_words or
+python -m benchmarks.load_test for the end-to-end harness (stub LLM + fake Telegram),
+python -m benchmarks.shard_test for the multi-process sharded deployment
+"""
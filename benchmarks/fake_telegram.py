@@ -0,0 +1,123 @@
+"""
+Offline stand-ins for Telegram
+FakeBot records every call the bot makes instead of hitting the Bot API, and
+TrafficGenerator produces realistic private and group updates with a
+configurable share of wake-word mentions and repeated greetings
+"""
+
+import asyncio
+import random
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional
+
+from telegram import Chat, Message, Update, User
+
+CHATTER = (
+    "bro ngl fr this is so mid tbh who asked lmao ok wait what did you eat today "
+    "exam tomorrow help me with python bhai kya scene hai server down again yaar "
+    "ranked match lost again deploy failed vibe check periodt slay sus no cap"
+).split()
+GREETINGS = ("hi", "hello", "hey", "gm", "good morning", "yo")
+
+
+class FakeBot:
+    """
+    Records sends instead of calling Telegram, with a fixed fake API latency
+    first_reply maps the asyncio task that handled an update to the time of
+    its first send_message, which is what the user perceives as reply latency
+    """
+
+    defaults = None  # Read by Message.reply_text for quoting
+
+    def __init__(self, username: str = "AnikahBot", user_id: int = 1, send_latency_ms: float = 30):
+        self.username = username
+        self.id = user_id
+        self.send_latency = send_latency_ms / 1000
+        self.calls: Counter = Counter()
+        self.first_reply: Dict[asyncio.Task, float] = {}
+        self._next_message_id = 1_000_000
+        self._me = User(user_id, "Anikah", True, username=username)
+
+    async def _call(self, method: str) -> None:
+        self.calls[method] += 1
+        await asyncio.sleep(self.send_latency)
+
+    async def get_me(self, **kwargs) -> User:
+        self.calls["get_me"] += 1
+        return self._me
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> Message:
+        await self._call("send_message")
+        self.first_reply.setdefault(asyncio.current_task(), time.perf_counter())
+        self._next_message_id += 1
+        message = Message(
+            self._next_message_id, datetime.now(), Chat(chat_id, Chat.PRIVATE),
+            from_user=self._me, text=text
+        )
+        message.set_bot(self)
+        return message
+
+    async def send_chat_action(self, chat_id: int, action: str, **kwargs) -> bool:
+        await self._call("send_chat_action")
+        return True
+
+    async def edit_message_text(self, text: str, chat_id: Optional[int] = None,
+                                message_id: Optional[int] = None, **kwargs) -> bool:
+        await self._call("edit_message_text")
+        return True
+
+    async def send_photo(self, chat_id: int, photo, **kwargs) -> Message:
+        await self._call("send_photo")
+        return await self.send_message(chat_id, kwargs.get("caption") or "")
+
+
+class TrafficGenerator:
+    """Synthetic updates from a fixed population of users and groups"""
+
+    def __init__(self, bot: FakeBot, users: int = 2000, groups: int = 50, private_ratio: float = 0.5,
+                 mention_ratio: float = 0.2, greeting_ratio: float = 0.2, seed: int = 7):
+        self.bot = bot
+        self.users = users
+        self.groups = groups
+        self.private_ratio = private_ratio
+        self.mention_ratio = mention_ratio
+        self.greeting_ratio = greeting_ratio
+        self.rng = random.Random(seed)
+        self._message_ids: Dict[int, int] = {}  # Per chat, ids only grow
+
+    def _text(self, mention: bool) -> str:
+        if self.rng.random() < self.greeting_ratio:
+            text = self.rng.choice(GREETINGS)
+        else:
+            text = " ".join(self.rng.choices(CHATTER, k=self.rng.randint(3, 20)))
+        if mention:
+            text = f"{self.rng.choice(('anikah', 'Ani', 'anu'))} {text}"
+        return text
+
+    def make(self, update_id: int) -> Update:
+        return Update.de_json(self.make_dict(update_id), self.bot)
+
+    def make_dict(self, update_id: int) -> Dict:
+        """The update as Telegram would send it"""
+        user_id = 100_000 + self.rng.randrange(self.users)
+        if self.groups and self.rng.random() >= self.private_ratio:
+            chat = {"id": -1_000_000 - self.rng.randrange(self.groups), "type": "supergroup", "title": "bench"}
+            text = self._text(self.rng.random() < self.mention_ratio)
+        else:
+            chat = {"id": user_id, "type": "private", "first_name": f"user{user_id}"}
+            text = self._text(False)
+
+        message_id = self._message_ids.get(chat["id"], 0) + 1
+        self._message_ids[chat["id"]] = message_id
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": chat,
+                "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "username": f"user{user_id}"},
+                "text": text
+            }
+        }
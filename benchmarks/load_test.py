@@ -0,0 +1,160 @@
+"""
+End-to-end load test, fully offline
+Starts the stub completions API, points AnikahBot at it, feeds synthetic
+updates through the update processor into handle_message at a fixed rate
+(open loop) with a FakeBot standing in for Telegram, then reports throughput,
+reply latency percentiles, API calls saved and memory growth
+
+    python -m benchmarks.load_test --messages 2000 --rate 20
+    python -m benchmarks.load_test --rate 100 --env RATE_LIMIT_GLOBAL_RATE=1000 --env STREAM_RESPONSES=true
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import List, Optional
+
+from benchmarks.fake_telegram import FakeBot, TrafficGenerator
+from benchmarks.stub_llm import StubLLM, start_stub_server
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHAT_TYPES = ("private", "supergroup")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+def configure_env(endpoint: str, overrides: List[str]) -> None:
+    """Offline defaults for the bot's config, applied before it is imported"""
+    os.environ.update({
+        "BOT_TOKEN": "123456:offline-benchmark",
+        "API_UPSTREAMS": json.dumps([{
+            "name": "stub", "endpoint": endpoint, "api_key": "stub", "model": "stub-model",
+            "tiers": ["main", "small"]
+        }]),
+        "METRICS_PORT": "0",
+        "BOT_MODE": "polling"
+    })
+    for override in overrides:
+        key, _, value = override.partition("=")
+        os.environ[key] = value
+
+
+async def run(args: argparse.Namespace) -> None:
+    stub = StubLLM(args.median_ms, args.sigma, args.error_rate, args.rate_limit_rate, seed=args.seed)
+    stub_runner, endpoint = await start_stub_server(stub)
+    configure_env(endpoint, args.env)
+
+    # The bot writes its log, memory and conversation files relative to the cwd
+    sys.path.insert(0, REPO_ROOT)
+    workdir = tempfile.TemporaryDirectory()
+    os.chdir(workdir.name)
+    # Anything that imports config has to come after configure_env
+    anikah = importlib.import_module("anikah")
+    from benchmarks.memory_footprint import rss_bytes
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    bot = anikah.AnikahBot()
+    fake = FakeBot(send_latency_ms=args.send_latency_ms)
+    traffic = TrafficGenerator(
+        fake, args.users, args.groups, args.private_ratio, args.mention_ratio, args.greeting_ratio, args.seed
+    )
+    context = SimpleNamespace(bot=fake)
+
+    await asyncio.gather(bot.start_http_session(), bot.warm_memory())
+    if bot.memory_store:
+        bot.memory_store.start()
+    bot.conversation_logger.start()
+
+    async def dispatch(update) -> float:
+        coroutine = bot.handle_message(update, context)
+        if bot.update_processor:
+            await bot.update_processor.process_update(update, coroutine)
+        else:
+            await coroutine
+        return time.perf_counter()
+
+    rss_before = rss_bytes()
+    dispatched: List[tuple] = []
+    interval = 1 / args.rate
+    start = time.perf_counter()
+    for i in range(args.messages):
+        delay = start + i * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        dispatched.append((time.perf_counter(), asyncio.create_task(dispatch(traffic.make(i + 1)))))
+    offered_seconds = time.perf_counter() - start
+    await asyncio.gather(*(task for _, task in dispatched))
+    wall_seconds = time.perf_counter() - start
+    rss_after = rss_bytes()
+
+    reply_latencies = [
+        fake.first_reply[task] - sent_at for sent_at, task in dispatched if task in fake.first_reply
+    ]
+    outcomes = {
+        outcome: sum(bot.metrics.messages.value(chat_type=chat_type, outcome=outcome) for chat_type in CHAT_TYPES)
+        for outcome in (
+            anikah.OUTCOME_IGNORED, anikah.OUTCOME_COALESCED, anikah.OUTCOME_THROTTLED, anikah.OUTCOME_CACHED,
+            anikah.OUTCOME_ANSWERED, anikah.OUTCOME_FALLBACK, anikah.OUTCOME_ERROR
+        )
+    }
+    saved = outcomes[anikah.OUTCOME_CACHED] + outcomes[anikah.OUTCOME_COALESCED]
+
+    print(f"offered    : {args.messages} updates at {args.rate:g}/s "
+          f"(dispatched in {offered_seconds:.1f}s, drained in {wall_seconds:.1f}s)")
+    print("outcomes   : " + ", ".join(f"{name} {int(count)}" for name, count in outcomes.items() if count))
+    print(f"throughput : {len(reply_latencies) / wall_seconds:.1f} replies/s")
+    print(f"latency    : p50 {percentile(reply_latencies, 0.5) * 1000:.0f}ms, "
+          f"p95 {percentile(reply_latencies, 0.95) * 1000:.0f}ms, "
+          f"p99 {percentile(reply_latencies, 0.99) * 1000:.0f}ms (update to first reply)")
+    print(f"API calls  : {stub.requests} to the stub ({stub.errors} errors, {stub.rate_limited} 429s, "
+          f"peak {stub.max_in_flight} in flight), {int(saved)} saved by cache/coalescing")
+    print("telegram   : " + ", ".join(f"{method} {count}" for method, count in sorted(fake.calls.items())))
+    users = len(bot.memory_store.hot) if bot.memory_store else 0
+    print(f"memory     : RSS +{(rss_after - rss_before) / 2**20:.1f} MiB, {users} users in memory")
+
+    await bot.close_http_session()
+    if bot.memory_store:
+        await bot.memory_store.close()
+    await asyncio.to_thread(bot.conversation_logger.close)
+    await stub_runner.cleanup()
+    os.chdir(REPO_ROOT)
+    workdir.cleanup()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=20, help="Offered updates per second")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--private-ratio", type=float, default=0.5)
+    parser.add_argument("--mention-ratio", type=float, default=0.2)
+    parser.add_argument("--greeting-ratio", type=float, default=0.2)
+    parser.add_argument("--median-ms", type=float, default=400, help="Stub API median latency")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Log-normal spread of stub latency")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--send-latency-ms", type=float, default=30, help="Fake Telegram API latency")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Config override for the bot, repeatable")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--verbose", action="store_true", help="Keep the bot's INFO logging")
+    asyncio.run(run(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
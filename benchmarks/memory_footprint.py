@@ -0,0 +1,127 @@
+"""
+Memory footprint and startup benchmark
+Generates a synthetic anikah_memory.json, then loads it in a fresh process
+per strategy and prints load time and RSS growth:
+  legacy   - json.load of the whole file into dicts, as the original load_memory did
+  records  - every user read row by row from SQLite into compact UserRecords
+  lazy     - SQLite cold storage with only the most recently active users preloaded
+
+    python -m benchmarks.memory_footprint --users 100000 --preload 1000
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict
+
+from memory_store import MemoryStore, SqliteBackend, read_legacy_json
+from user_record import UserRecord
+
+STRATEGIES = ("legacy", "records", "lazy")
+
+WORDS = (
+    "bro ngl fr this is so mid tbh who asked lmao ok wait what did you eat today "
+    "exam tomorrow help me with python bhai kya scene hai server down again yaar"
+).split()
+
+
+def rss_bytes() -> int:
+    """Current resident set size, from /proc where available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Peak, KiB on Linux
+
+
+def build_legacy_file(path: str, users: int, seed: int) -> None:
+    rng = random.Random(seed)
+    now = datetime.now()
+    memory = {}
+    for user_id in range(users):
+        last = now - timedelta(seconds=rng.randint(0, 90 * 86400))
+        memory[str(1_000_000 + user_id)] = {
+            "username": f"user{user_id}",
+            "first_interaction": (last - timedelta(days=rng.randint(0, 365))).isoformat(),
+            "message_count": rng.randint(1, 500),
+            "recent_messages": [
+                {
+                    "user": " ".join(rng.choices(WORDS, k=rng.randint(3, 30))),
+                    "bot": " ".join(rng.choices(WORDS, k=rng.randint(5, 40))),
+                    "timestamp": last.isoformat()
+                }
+                for _ in range(5)
+            ],
+            "last_interaction": last.isoformat()
+        }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(memory, f, ensure_ascii=False, indent=2)
+
+
+def run_strategy(strategy: str, json_path: str, db_path: str, preload: int) -> Dict:
+    """Runs inside the child process so RSS only reflects this strategy"""
+    baseline = rss_bytes()
+    start = time.perf_counter()
+    if strategy == "legacy":
+        held = read_legacy_json(json_path)
+    elif strategy == "records":
+        backend = SqliteBackend(db_path)
+        held = {key: UserRecord.from_dict(json.loads(data)) for key, data in backend.reader.execute(
+            "SELECT user_key, data FROM users"
+        )}
+    else:
+        store = MemoryStore(SqliteBackend(db_path), flush_interval=60)
+        store.load(preload)
+        held = store.hot
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "rss": rss_bytes() - baseline, "users": len(held)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--preload", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--child", choices=STRATEGIES, help=argparse.SUPPRESS)
+    parser.add_argument("--json-path", help=argparse.SUPPRESS)
+    parser.add_argument("--db-path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_strategy(args.child, args.json_path, args.db_path, args.preload)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "anikah_memory.json")
+        db_path = os.path.join(tmp, "anikah_memory.db")
+        build_legacy_file(json_path, args.users, args.seed)
+
+        # One-off migration, not part of startup
+        start = time.perf_counter()
+        backend = SqliteBackend(db_path, legacy_json=json_path)
+        backend.load_recent(0)
+        backend.close()
+        migrate_seconds = time.perf_counter() - start
+
+        print(f"{args.users} users, legacy JSON {os.path.getsize(json_path) / 2**20:.1f} MiB, "
+              f"SQLite {os.path.getsize(db_path) / 2**20:.1f} MiB (migrated in {migrate_seconds:.2f}s)")
+        for strategy in STRATEGIES:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.memory_footprint", "--child", strategy,
+                 "--json-path", json_path, "--db-path", db_path, "--preload", str(args.preload)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{strategy:8}: {result['seconds']:7.3f}s load, {result['rss'] / 2**20:8.1f} MiB RSS, "
+                  f"{result['users']} users in RAM")
+
+
+if __name__ == "__main__":
+    main()
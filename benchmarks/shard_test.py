@@ -0,0 +1,156 @@
+"""
+Sharded deployment test, fully offline and multi-process
+Starts the stub completions API and a stub Bot API, launches sharding.py
+(front + N worker processes) against them, feeds synthetic traffic through
+getUpdates, then reports how updates spread over the shards, reply latency,
+and how long the graceful shutdown took
+
+    python -m benchmarks.shard_test --shards 4 --messages 2000 --rate 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from benchmarks.fake_telegram import FakeBot, TrafficGenerator
+from benchmarks.load_test import percentile
+from benchmarks.stub_llm import StubLLM, start_stub_server
+from benchmarks.stub_telegram import StubBotAPI, start_stub_bot_api
+from webhook import SECRET_TOKEN_HEADER
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WEBHOOK_PATH = "/telegram"
+
+
+async def shard_stats(urls: List[str], secret_token: str) -> List[Optional[Dict]]:
+    async def fetch(session: aiohttp.ClientSession, url: str) -> Optional[Dict]:
+        try:
+            async with session.get(f"{url}/stats", headers={SECRET_TOKEN_HEADER: secret_token}) as response:
+                return await response.json() if response.status == 200 else None
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2)) as session:
+        return await asyncio.gather(*(fetch(session, url) for url in urls))
+
+
+async def run(args: argparse.Namespace) -> None:
+    stub = StubLLM(args.median_ms, args.sigma, args.error_rate, seed=args.seed)
+    stub_runner, endpoint = await start_stub_server(stub)
+    bot_api = StubBotAPI(send_latency_ms=args.send_latency_ms)
+    bot_api_runner, base_url = await start_stub_bot_api(bot_api)
+    secret_token = secrets.token_urlsafe(16)
+    urls = [f"http://127.0.0.1:{args.base_port + index}{WEBHOOK_PATH}" for index in range(args.shards)]
+
+    env = dict(os.environ)
+    env.update({
+        "BOT_TOKEN": "123456:offline-benchmark",
+        "TELEGRAM_BASE_URL": base_url,
+        "API_UPSTREAMS": json.dumps([{
+            "name": "stub", "endpoint": endpoint, "api_key": "stub", "model": "stub-model",
+            "tiers": ["main", "small"]
+        }]),
+        "BOT_MODE": "polling",
+        "METRICS_PORT": "0",
+        "SHARD_COUNT": str(args.shards),
+        "SHARD_BASE_PORT": str(args.base_port),
+        "WEBHOOK_PATH": WEBHOOK_PATH,
+        "WEBHOOK_SECRET_TOKEN": secret_token
+    })
+    for override in args.env:
+        key, _, value = override.partition("=")
+        env[key] = value
+
+    # Front and workers write their memory, state and log files into a scratch dir
+    workdir = tempfile.TemporaryDirectory()
+    output = None if args.verbose else subprocess.DEVNULL
+    front = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(REPO_ROOT, "sharding.py"), cwd=workdir.name, env=env,
+        stdout=output, stderr=output
+    )
+    try:
+        started = time.perf_counter()
+        while not all(await shard_stats(urls, secret_token)):
+            if time.perf_counter() - started > 60:
+                raise RuntimeError("shards did not come up within 60s")
+            await asyncio.sleep(0.2)
+        print(f"startup    : {args.shards} shards up in {time.perf_counter() - started:.1f}s")
+
+        traffic = TrafficGenerator(
+            FakeBot(), args.users, args.groups, args.private_ratio, args.mention_ratio, args.greeting_ratio, args.seed
+        )
+        interval = 1 / args.rate
+        start = time.perf_counter()
+        for i in range(args.messages):
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            bot_api.feed(traffic.make_dict(i + 1))
+
+        # Done once everything was fetched, the API is idle and no reply went out for a while
+        while bot_api.pending or stub.in_flight or time.perf_counter() - bot_api.last_send < args.idle_seconds:
+            await asyncio.sleep(0.2)
+        wall_seconds = bot_api.last_send - start
+        shards = await shard_stats(urls, secret_token)
+
+        latencies = bot_api.reply_latencies
+        print(f"offered    : {args.messages} updates at {args.rate:g}/s, last reply after {wall_seconds:.1f}s")
+        for index, shard in enumerate(shards):
+            if shard:
+                print(f"shard {index:<5}: {shard['total_messages']} answered, {shard['users']} users, "
+                      f"{shard['sent']} Telegram calls, cold start {shard['cold_start_seconds']:.2f}s, "
+                      f"first reply {shard['first_reply_seconds'] or 0:.2f}s")
+            else:
+                print(f"shard {index:<5}: no stats")
+        print(f"latency    : p50 {percentile(latencies, 0.5) * 1000:.0f}ms, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.0f}ms, "
+              f"p99 {percentile(latencies, 0.99) * 1000:.0f}ms (private chats, fed to first reply)")
+        print(f"API calls  : {stub.requests} to the stub, peak {stub.max_in_flight} in flight")
+        print("telegram   : " + ", ".join(f"{method} {count}" for method, count in sorted(bot_api.calls.items())))
+    finally:
+        stopping = time.perf_counter()
+        if front.returncode is None:
+            front.send_signal(signal.SIGTERM)
+        await asyncio.wait_for(front.wait(), 120)
+        print(f"shutdown   : front exited with {front.returncode} in {time.perf_counter() - stopping:.1f}s, "
+              f"files: {', '.join(sorted(name for name in os.listdir(workdir.name) if 'shard' in name))}")
+        await bot_api_runner.cleanup()
+        await stub_runner.cleanup()
+        workdir.cleanup()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--shards", type=int, default=2)
+    parser.add_argument("--base-port", type=int, default=18450, help="Worker i takes updates on this + i")
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=20, help="Offered updates per second")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--private-ratio", type=float, default=0.5)
+    parser.add_argument("--mention-ratio", type=float, default=0.2)
+    parser.add_argument("--greeting-ratio", type=float, default=0.2)
+    parser.add_argument("--median-ms", type=float, default=400, help="Stub API median latency")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Log-normal spread of stub latency")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--send-latency-ms", type=float, default=30, help="Stub Bot API latency")
+    parser.add_argument("--idle-seconds", type=float, default=3, help="Quiet time that ends the run")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Config override for the front and workers, repeatable")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--verbose", action="store_true", help="Show the front's and workers' logs")
+    asyncio.run(run(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Local stub of an OpenAI-compatible chat completions API
+Latency is drawn from a log-normal distribution around a median; a share of
+requests fail with 500s or 429s (with Retry-After) so retries, hedging and
+failover can be exercised offline. Streams SSE when the request asks for it
+
+    python -m benchmarks.stub_llm --port 8999 --median-ms 400 --error-rate 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+from typing import Dict, Optional, Tuple
+
+from aiohttp import web
+
+REPLIES = (
+    "ngl that's lowkey a vibe fr",
+    "bro what 😭 explain",
+    "okay but hear me out, you're kinda right",
+    "that's so mid tbh, try again",
+    "yess bestie we love to see it ✨",
+    "hmm lemme think... nah you got this",
+)
+
+
+class StubLLM:
+    """Request handler with configurable latency and failure distributions"""
+
+    def __init__(self, median_ms: float = 400, sigma: float = 0.5, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, retry_after: float = 1.0, token_delay_ms: float = 15,
+                 seed: Optional[int] = None):
+        self.median = median_ms / 1000
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.token_delay = token_delay_ms / 1000
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def latency(self) -> float:
+        return self.median * math.exp(self.rng.gauss(0, self.sigma))
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            payload = await request.json()
+            roll = self.rng.random()
+            if roll < self.rate_limit_rate:
+                self.rate_limited += 1
+                return web.json_response(
+                    {"error": {"message": "rate limited"}}, status=429,
+                    headers={"Retry-After": f"{self.retry_after:g}"}
+                )
+            await asyncio.sleep(self.latency())
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.errors += 1
+                return web.json_response({"error": {"message": "stub upstream error"}}, status=500)
+
+            reply = self.rng.choice(REPLIES)
+            if payload.get("stream"):
+                return await self._stream(request, reply)
+            return web.json_response({
+                "id": f"stub-{self.requests}",
+                "object": "chat.completion",
+                "model": payload.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}]
+            })
+        finally:
+            self.in_flight -= 1
+
+    async def _stream(self, request: web.Request, reply: str) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for word in reply.split(" "):
+            chunk = {"choices": [{"index": 0, "delta": {"content": word + " "}}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(self.token_delay)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "max_in_flight": self.max_in_flight
+        }
+
+
+async def start_stub_server(stub: StubLLM, host: str = "127.0.0.1", port: int = 0) -> Tuple[web.AppRunner, str]:
+    """Serve the stub, returns the runner and the completions endpoint URL"""
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", stub.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    bound_port = runner.addresses[0][1]  # Resolves port 0
+    return runner, f"http://{host}:{bound_port}/v1/chat/completions"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8999)
+    parser.add_argument("--median-ms", type=float, default=400)
+    parser.add_argument("--sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    async def serve() -> None:
+        stub = StubLLM(args.median_ms, args.sigma, args.error_rate, args.rate_limit_rate)
+        runner, endpoint = await start_stub_server(stub, args.host, args.port)
+        print(f"Stub completions API on {endpoint}")
+        try:
+            await asyncio.Future()
+        finally:
+            await runner.cleanup()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Local stub of the Telegram Bot API over HTTP
+Serves fed updates through getUpdates (long polling, offsets confirm them)
+and answers the send/edit/typing calls the bot makes, so separate processes
+(the sharded front and its workers) can run against it via TELEGRAM_BASE_URL
+"""
+
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict, deque
+from typing import Deque, Dict, List, Tuple
+
+from aiohttp import web
+
+
+class StubBotAPI:
+    """
+    Bot API endpoints backed by an in-memory update list
+    reply_latencies holds, for private chats, the time from an update being
+    fed to the next sendMessage in that chat (FIFO per chat, approximate when
+    messages get coalesced)
+    """
+
+    def __init__(self, username: str = "AnikahBot", user_id: int = 1, send_latency_ms: float = 30):
+        self.me = {"id": user_id, "is_bot": True, "first_name": "Anikah", "username": username}
+        self.send_latency = send_latency_ms / 1000
+        self.pending: List[Dict] = []
+        self._fed = asyncio.Event()
+        self.calls: Counter = Counter()
+        self.reply_latencies: List[float] = []
+        self._unanswered: Dict[int, Deque[float]] = defaultdict(deque)
+        self._next_message_id = 1_000_000
+        self.last_send = time.perf_counter()
+
+    def feed(self, update: Dict) -> None:
+        chat = update["message"]["chat"]
+        if chat["type"] == "private":
+            self._unanswered[chat["id"]].append(time.perf_counter())
+        self.pending.append(update)
+        self._fed.set()
+
+    async def _params(self, request: web.Request) -> Dict:
+        if request.content_type == "application/json":
+            return await request.json()
+        params = dict(await request.post())  # PTB sends form fields, non-strings JSON-encoded
+        for key, value in params.items():
+            if isinstance(value, str):
+                try:
+                    params[key] = json.loads(value)
+                except ValueError:
+                    pass
+        return params
+
+    def _message(self, chat_id: int, text: str) -> Dict:
+        self._next_message_id += 1
+        return {
+            "message_id": self._next_message_id, "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": self.me, "text": text
+        }
+
+    async def get_updates(self, params: Dict) -> List[Dict]:
+        offset = int(params.get("offset") or 0)
+        self.pending = [update for update in self.pending if update["update_id"] >= offset]
+        if not self.pending and params.get("timeout"):
+            self._fed.clear()
+            try:
+                await asyncio.wait_for(self._fed.wait(), float(params["timeout"]))
+            except asyncio.TimeoutError:
+                pass
+        return self.pending[:int(params.get("limit") or 100)]
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await self._params(request)
+        self.calls[method] += 1
+        if method == "getMe":
+            result = self.me
+        elif method == "getUpdates":
+            result = await self.get_updates(params)
+        elif method in ("sendMessage", "sendPhoto", "editMessageText"):
+            await asyncio.sleep(self.send_latency)
+            chat_id = int(params["chat_id"])
+            now = time.perf_counter()
+            self.last_send = now
+            if method == "sendMessage" and self._unanswered.get(chat_id):
+                self.reply_latencies.append(now - self._unanswered[chat_id].popleft())
+            result = self._message(chat_id, params.get("text") or params.get("caption") or "")
+            if method == "sendPhoto":
+                result["photo"] = [{"file_id": "stub-photo", "file_unique_id": "stub", "width": 1, "height": 1}]
+        else:
+            result = True  # sendChatAction, deleteWebhook, setWebhook, ...
+        return web.json_response({"ok": True, "result": result})
+
+
+async def start_stub_bot_api(stub: StubBotAPI, host: str = "127.0.0.1",
+                             port: int = 0) -> Tuple[web.AppRunner, str]:
+    """Serve the stub, returns the runner and the base URL for TELEGRAM_BASE_URL"""
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", stub.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    bound_port = runner.addresses[0][1]
+    return runner, f"http://{host}:{bound_port}/bot"
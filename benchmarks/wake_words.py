@@ -0,0 +1,81 @@
+"""
+Wake-word matcher microbenchmark
+Compares the original per-name substring scan with the compiled matcher on a
+synthetic group-chat corpus and prints messages per second
+
+    python -m benchmarks.wake_words --messages 200000 --mention-ratio 0.02
+"""
+
+import argparse
+import random
+import time
+from typing import Callable, List
+
+from config import BOT_NAMES
+from wake_words import WakeWordMatcher
+
+BOT_USERNAME = "AnikahBot"
+
+# Chatter with near-misses like "animal" and "anime" that a substring scan trips on
+VOCAB = (
+    "bro ngl fr this is so mid tbh who asked lmao ok wait what did you eat today "
+    "anime animal company banana manual exam bhai kya scene hai kal milte hain "
+    "game ranked match lost again yaar code bug deploy server down python rust "
+    "vibe check periodt slay sus bet cap no cap W L based cringe"
+).split()
+MENTIONS = ["anikah", "Ani", "anu", "ANIKA", f"@{BOT_USERNAME}"]
+
+
+def build_corpus(count: int, mention_ratio: float, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        words = rng.choices(VOCAB, k=rng.randint(3, 25))
+        if rng.random() < mention_ratio:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(MENTIONS))
+        corpus.append(" ".join(words))
+    return corpus
+
+
+def legacy_check(text: str) -> bool:
+    """The original should_respond_in_group text checks"""
+    if f"@{BOT_USERNAME.lower()}" in text.lower():
+        return True
+    text_lower = text.lower()
+    return any(name.lower() in text_lower for name in BOT_NAMES)
+
+
+def measure(check: Callable[[str], object], corpus: List[str], rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for text in corpus:
+            check(text)
+        best = min(best, time.perf_counter() - start)
+    return len(corpus) / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--mention-ratio", type=float, default=0.01)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages, args.mention_ratio, args.seed)
+    matcher = WakeWordMatcher(BOT_NAMES, BOT_USERNAME)
+
+    legacy_hits = sum(1 for text in corpus if legacy_check(text))
+    compiled_hits = sum(1 for text in corpus if matcher.match(text))
+    legacy_rate = measure(legacy_check, corpus, args.rounds)
+    compiled_rate = measure(matcher.match, corpus, args.rounds)
+
+    print(f"corpus: {len(corpus)} messages, {args.mention_ratio:.1%} real mentions")
+    print(f"legacy substring scan : {legacy_rate:12,.0f} msg/s  ({legacy_hits} matched)")
+    print(f"compiled matcher      : {compiled_rate:12,.0f} msg/s  ({compiled_hits} matched)")
+    print(f"speedup               : {compiled_rate / legacy_rate:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Small persistent bot state
+The update_id every update up to has been handled (so a restart can skip what
+Telegram redelivers without dropping anything that was still queued or running)
+and the running totals behind /stats, checkpointed atomically to a JSON file
+"""
+
+import json
+import logging
+import os
+import tempfile
+from typing import Dict, Set
+
+logger = logging.getLogger(__name__)
+
+
+class BotState:
+    def __init__(self, path: str):
+        self.path = path
+        self.last_update_id = 0
+        self.stats: Dict = {}
+        self._in_flight: Set[int] = set()  # Arrived but not finished, waiting on a chat lock included
+        self._max_seen = 0
+
+    def load(self) -> None:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error(f"Failed to read state file {self.path}, starting fresh: {e}")
+            return
+        self.last_update_id = self._max_seen = int(data.get("last_update_id", 0))
+        self.stats = data.get("stats", {})
+
+    def update_started(self, update_id: int) -> None:
+        self._in_flight.add(update_id)
+        self._max_seen = max(self._max_seen, update_id)
+
+    def update_finished(self, update_id: int) -> None:
+        """Advance last_update_id to the highest id below which every update has finished"""
+        self._in_flight.discard(update_id)
+        done_through = min(self._in_flight) - 1 if self._in_flight else self._max_seen
+        self.last_update_id = max(self.last_update_id, done_through)
+
+    def save(self) -> None:
+        """Write the state atomically (temp file + fsync + rename)"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".anikah_state.", dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"last_update_id": self.last_update_id, "stats": self.stats}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
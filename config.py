@@ -1,7 +1,10 @@
 # config.py
 
+import json
 import os
 
+from wake_words import WakeWordMatcher
+
 # Telegram bot authentication
 BOT_TOKEN = os.getenv("BOT_TOKEN", "8271328008:AAEhwWh3rDOXf8utkgK9uqTmDK8zuAlEAu4")
 
@@ -15,12 +18,140 @@ OWNER_USERNAMES = {"Rystrix", "Rystrix_XD"}
 # Bot wake-names for group chat mention (case-insensitive matching recommended in your main code)
 BOT_NAMES = {"anikah", "anika", "Anikah", "Anika", "Ani", "ani", "anu", "Anu", "Anuh" , "anuh"}
 
+# Compiled once, whole-word and case-insensitive
+_BOT_NAME_MATCHER = WakeWordMatcher(BOT_NAMES)
+
 # API endpoints and model
 API_KEY = os.getenv("API_KEY", "sk-friend-02-3a4f2e9c8d7b6a5f4e3d2c1b0a9f8e7d")
 API_BASE = "https://api.akashiverse.com/v1"
 API_MODEL_LIST = "https://api.akashiverse.com/v1/models"
 API_ENDPOINT = "https://api.akashiverse.com/v1/chat/completions"
 MODEL = "gpt-5"  
+
+# Upstream pool, JSON list of {"name", "endpoint", "api_key", "model", "weight", "max_concurrency", "tiers"}
+# tiers: "main" for help/long requests, "small" for short small talk. Defaults to the single endpoint above.
+API_UPSTREAMS = json.loads(os.getenv("API_UPSTREAMS", "[]")) or [
+    {"name": "akashiverse", "endpoint": API_ENDPOINT, "api_key": API_KEY, "model": MODEL,
+     "weight": 1.0, "max_concurrency": 32, "tiers": ["main", "small"]}
+]
+ROUTING_EWMA_ALPHA = float(os.getenv("ROUTING_EWMA_ALPHA", "0.2"))  # Weight of the newest latency/error sample
+ROUTING_ERROR_PENALTY = float(os.getenv("ROUTING_ERROR_PENALTY", "4"))  # Score multiplier per unit error rate
+SMALL_TALK_MAX_CHARS = int(os.getenv("SMALL_TALK_MAX_CHARS", "60"))
+HELP_KEYWORDS = {
+    "help", "explain", "how", "why", "code", "error", "bug", "study", "homework", "solve",
+    "math", "physics", "chemistry", "teach", "learn", "advice", "kaise", "kyun", "samjhao"
+}
+
+# Upstream HTTP connection pool (one shared session per bot)
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "5"))  # TCP/TLS connect
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", "30"))  # Max gap between bytes (and stream chunks)
+API_POOL_LIMIT = int(os.getenv("API_POOL_LIMIT", "100"))
+API_POOL_LIMIT_PER_HOST = int(os.getenv("API_POOL_LIMIT_PER_HOST", "20"))
+API_KEEPALIVE_TIMEOUT = float(os.getenv("API_KEEPALIVE_TIMEOUT", "60"))
+API_DNS_CACHE_TTL = int(os.getenv("API_DNS_CACHE_TTL", "300"))
+
+# Streaming replies (first tokens sent immediately, then coalesced message edits)
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "false").lower() == "true"
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.5"))  # Seconds between edits
+STREAM_MIN_EDIT_CHARS = int(os.getenv("STREAM_MIN_EDIT_CHARS", "20"))  # New chars needed per edit
+
+# Update concurrency (different chats in parallel, same chat in order); 1 = one update at a time
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "32"))
+PER_USER_MAX_IN_FLIGHT = int(os.getenv("PER_USER_MAX_IN_FLIGHT", "2"))
+# Updates one chat may have waiting or running, newer ones are dropped so a flood stays bounded; 0 = no limit
+CHAT_QUEUE_LIMIT = int(os.getenv("CHAT_QUEUE_LIMIT", "50"))
+
+# Response cache for repeated short prompts ("anikah", "hi ani", ...)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "600"))  # Seconds
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(2 * 1024 * 1024)))
+RESPONSE_CACHE_CANDIDATES = int(os.getenv("RESPONSE_CACHE_CANDIDATES", "3"))  # Varied replies kept per key
+RESPONSE_CACHE_MAX_MESSAGE_CHARS = int(os.getenv("RESPONSE_CACHE_MAX_MESSAGE_CHARS", "40"))
+RESPONSE_CACHE_CONTEXT_MESSAGES = int(os.getenv("RESPONSE_CACHE_CONTEXT_MESSAGES", "1"))  # Exchanges hashed into the key
+
+# Retries, hedging and circuit breaker for the completions API
+API_DEADLINE = float(os.getenv("API_DEADLINE", "45"))  # Whole reply budget, retries included
+API_MAX_ATTEMPTS = int(os.getenv("API_MAX_ATTEMPTS", "3"))
+API_BACKOFF_BASE = float(os.getenv("API_BACKOFF_BASE", "0.5"))  # Seconds, doubled per attempt with full jitter
+API_BACKOFF_MAX = float(os.getenv("API_BACKOFF_MAX", "8"))  # Also caps how long Retry-After is honored
+API_HEDGE_PERCENTILE = float(os.getenv("API_HEDGE_PERCENTILE", "95"))  # Hedge past this latency percentile, 0 disables
+API_HEDGE_MIN_SAMPLES = int(os.getenv("API_HEDGE_MIN_SAMPLES", "20"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))  # Consecutive failures to open
+BREAKER_RECOVERY_TIMEOUT = float(os.getenv("BREAKER_RECOVERY_TIMEOUT", "30"))  # Seconds before a probe
+
+# Token-bucket rate limits (tokens per second, burst size) and idle bucket eviction
+RATE_LIMIT_USER_RATE = float(os.getenv("RATE_LIMIT_USER_RATE", "0.5"))
+RATE_LIMIT_USER_BURST = float(os.getenv("RATE_LIMIT_USER_BURST", "5"))
+RATE_LIMIT_CHAT_RATE = float(os.getenv("RATE_LIMIT_CHAT_RATE", "1"))
+RATE_LIMIT_CHAT_BURST = float(os.getenv("RATE_LIMIT_CHAT_BURST", "10"))
+RATE_LIMIT_GLOBAL_RATE = float(os.getenv("RATE_LIMIT_GLOBAL_RATE", "20"))
+RATE_LIMIT_GLOBAL_BURST = float(os.getenv("RATE_LIMIT_GLOBAL_BURST", "60"))
+RATE_LIMIT_IDLE_TTL = float(os.getenv("RATE_LIMIT_IDLE_TTL", "600"))  # Seconds before an idle bucket is dropped
+
+# Burst coalescing: queued messages from one user in one chat get a single answer.
+# COALESCE_WINDOW > 0 also waits that long for stragglers once a burst has started.
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", "0"))
+COALESCE_MAX_BATCH = int(os.getenv("COALESCE_MAX_BATCH", "5"))
+
+# Outbound Telegram pacing: messages per second per private chat, per group (Telegram allows
+# about 20 a minute there) and overall, plus retries after a 429 flood wait
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+TELEGRAM_GROUP_RATE = float(os.getenv("TELEGRAM_GROUP_RATE", str(20 / 60)))
+TELEGRAM_GROUP_BURST = float(os.getenv("TELEGRAM_GROUP_BURST", "5"))
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_GLOBAL_BURST = float(os.getenv("TELEGRAM_GLOBAL_BURST", "30"))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))
+TELEGRAM_TYPING_TTL = float(os.getenv("TELEGRAM_TYPING_TTL", "4.5"))  # A typing action shows for ~5s
+MEDIA_CACHE_FILE = os.getenv("MEDIA_CACHE_FILE", "anikah_media.json")  # Uploaded file_ids
+
+# Prompt context: total prompt token budget (system prompt included), history kept per user
+# before the oldest exchanges are folded into a rolling summary, and that summary's size
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_HISTORY_MAX = int(os.getenv("CONTEXT_HISTORY_MAX", "8"))
+CONTEXT_FOLD_BATCH = int(os.getenv("CONTEXT_FOLD_BATCH", "4"))
+CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "200"))
+CONTEXT_SUMMARY_CLIP_CHARS = int(os.getenv("CONTEXT_SUMMARY_CLIP_CHARS", "80"))
+CONTEXT_GROUP_MAX_TOKENS = int(os.getenv("CONTEXT_GROUP_MAX_TOKENS", "300"))  # Share of the budget for group chatter
+
+# Group chats: ring buffer of recent messages per chat (answered or not), least recently active chats evicted
+GROUP_CONTEXT_MESSAGES = int(os.getenv("GROUP_CONTEXT_MESSAGES", "30"))
+GROUP_CONTEXT_MAX_CHATS = int(os.getenv("GROUP_CONTEXT_MAX_CHATS", "5000"))
+GROUP_CONTEXT_MAX_CHARS = int(os.getenv("GROUP_CONTEXT_MAX_CHARS", "300"))  # Longer messages are clipped
+
+# How updates arrive: "polling" (getUpdates) or "webhook" (local aiohttp server, see webhook.py)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # Public HTTPS URL given to Telegram, empty skips setWebhook
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", "")  # Required, checked on every request
+WEBHOOK_MAX_PENDING = int(os.getenv("WEBHOOK_MAX_PENDING", "1000"))  # Unfinished updates before answering 503, 0 = unbounded
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))  # Parallel connections Telegram may open
+# For more than one process use the sharded mode (sharding.py), whose workers must not register the webhook
+WEBHOOK_REGISTER = os.getenv("WEBHOOK_REGISTER", "true").lower() == "true"
+
+# Restarts pick up the updates that queued while the bot was down instead of dropping them;
+# the last handled update_id and the /stats totals are checkpointed to STATE_FILE
+DROP_PENDING_UPDATES = os.getenv("DROP_PENDING_UPDATES", "false").lower() == "true"
+STATE_FILE = os.getenv("STATE_FILE", "anikah_state.json")
+STATE_CHECKPOINT_INTERVAL = float(os.getenv("STATE_CHECKPOINT_INTERVAL", "30"))  # Seconds, 0 = only on shutdown
+
+# Sharded deployment (python sharding.py): a front process takes the updates and routes each one by
+# chat_id to one of SHARD_COUNT worker processes, so a chat's memory and ordering live on one worker
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))  # Set by the front for each worker
+SHARD_BASE_PORT = int(os.getenv("SHARD_BASE_PORT", "8450"))  # Local worker i takes updates on SHARD_BASE_PORT + i
+# Comma-separated webhook URLs of workers started elsewhere (same order everywhere), instead of local processes
+SHARD_WORKER_URLS = [url.strip() for url in os.getenv("SHARD_WORKER_URLS", "").split(",") if url.strip()]
+SHARD_QUEUE_LIMIT = int(os.getenv("SHARD_QUEUE_LIMIT", "1000"))  # Updates buffered per worker before the front waits
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL", "https://api.telegram.org/bot")  # Point at a local Bot API stub
+
+# Prometheus text-format metrics on a local HTTP endpoint (port 0 disables it)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
 DEVELOPER_URL = "https://t.me/rystrix_xd"
 COMMUNITY_URL = "https://t.me/BrahMosAI"
 
@@ -89,8 +220,24 @@ let's be friends or whatever 👇"
 
 # Memory and logging
 MEMORY_ENABLED = True
-MEMORY_FILE = "anikah_memory.json"
-CONVERSATION_LOG = "anikah_conversations.log"
+MEMORY_FILE = os.getenv("MEMORY_FILE", "anikah_memory.json")  # Legacy JSON, imported into SQLite on first start
+MEMORY_BACKEND = os.getenv("MEMORY_BACKEND", "sqlite")  # "sqlite" (WAL, per-user rows) or "json"
+MEMORY_DB_FILE = os.getenv("MEMORY_DB_FILE", "anikah_memory.db")
+# Unsharded store (.db, or .json with MEMORY_BACKEND=json) an empty shard copies its own chats from, set by the front
+MEMORY_SEED_FILE = os.getenv("MEMORY_SEED_FILE", "")
+MEMORY_FLUSH_INTERVAL = float(os.getenv("MEMORY_FLUSH_INTERVAL", "5"))  # Seconds between batched writes
+# Users kept in RAM; the rest stay in the backend and load on their next message
+MEMORY_PRELOAD_USERS = int(os.getenv("MEMORY_PRELOAD_USERS", "1000"))  # Most recently active users loaded at startup
+MEMORY_HOT_MAX_USERS = int(os.getenv("MEMORY_HOT_MAX_USERS", "20000"))  # 0 = no limit
+MEMORY_IDLE_EVICT_SECONDS = float(os.getenv("MEMORY_IDLE_EVICT_SECONDS", str(6 * 3600)))  # 0 = never
+CONVERSATION_LOG = os.getenv("CONVERSATION_LOG", "anikah_conversations.log")
+CONVERSATION_LOG_QUEUE_SIZE = int(os.getenv("CONVERSATION_LOG_QUEUE_SIZE", "10000"))
+CONVERSATION_LOG_BATCH_SIZE = int(os.getenv("CONVERSATION_LOG_BATCH_SIZE", "200"))
+CONVERSATION_LOG_FLUSH_INTERVAL = float(os.getenv("CONVERSATION_LOG_FLUSH_INTERVAL", "1"))
+CONVERSATION_LOG_ROTATE_BYTES = int(os.getenv("CONVERSATION_LOG_ROTATE_BYTES", str(50 * 1024 * 1024)))  # 0 disables
+CONVERSATION_LOG_ROTATE_SECONDS = float(os.getenv("CONVERSATION_LOG_ROTATE_SECONDS", "86400"))  # 0 disables
+CONVERSATION_LOG_COMPRESS = os.getenv("CONVERSATION_LOG_COMPRESS", "true").lower() == "true"
+CONVERSATION_LOG_DROP_POLICY = os.getenv("CONVERSATION_LOG_DROP_POLICY", "drop_new")  # or "drop_old"
 
 # Utility functions
 def is_owner(user_id):
@@ -105,7 +252,4 @@ def is_owner_username(username):
 
 def is_bot_mentioned(text):
     """Check if the bot is mentioned in the text"""
-    if not text:
-        return False
-    text_lower = text.lower()
-    return any(name.lower() in text_lower for name in BOT_NAMES)
+    return _BOT_NAME_MATCHER.match(text) is not None
@@ -0,0 +1,131 @@
+"""
+Token-budgeted prompt context
+Estimates tokens locally, fills the budget with the newest history that fits
+and folds older exchanges into a short rolling per-user summary
+"""
+
+import re
+from typing import Dict, List, Optional
+
+from user_record import Exchange, UserRecord
+
+# Words split roughly every 4 characters, punctuation and symbols are a token each
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+# Chat formatting overhead per message (role and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+GROUP_HEADER = "Recent messages in this group chat:\n"
+
+# Floor for a message cut down to fit the budget
+MIN_MESSAGE_TOKENS = 64
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap BPE-like token estimate, errs slightly high for English"""
+    return sum(1 + (len(piece) - 1) // 4 for piece in _TOKEN_RE.findall(text))
+
+
+def clip(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[:max_chars - 1].rstrip() + "…"
+
+
+class ContextBuilder:
+    """Builds chat messages for one request within a prompt token budget"""
+
+    def __init__(self, system_prompt: str, token_budget: int, summary_max_tokens: int, clip_chars: int,
+                 group_max_tokens: int = 0):
+        # The prompt never changes, so it is measured once
+        self.system_message = {"role": "system", "content": system_prompt}
+        self.system_tokens = estimate_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+        self.token_budget = token_budget
+        self.summary_max_tokens = summary_max_tokens
+        self.clip_chars = clip_chars
+        self.group_max_tokens = group_max_tokens
+        self.group_header_tokens = estimate_tokens(GROUP_HEADER) + MESSAGE_OVERHEAD_TOKENS
+        self.truncated = 0  # Requests whose own message had to be cut to fit
+
+    def build(self, message: str, record: Optional[UserRecord], burst: Optional[List[str]] = None,
+              group_lines: Optional[List[str]] = None) -> List[Dict]:
+        """
+        System prompt, group chatter, summary, as much recent history as fits,
+        then the message(s) being answered
+        """
+        remaining = self.token_budget - self.system_tokens
+
+        # What we're answering always goes in, cut down only if it alone blows the budget
+        current = []
+        for text in (burst or []) + [message]:
+            tokens = estimate_tokens(text) + MESSAGE_OVERHEAD_TOKENS
+            if tokens > remaining:
+                # Keep a usable chunk even when the budget is already spent
+                text = text[:max(remaining - MESSAGE_OVERHEAD_TOKENS, MIN_MESSAGE_TOKENS) * 4]
+                tokens = estimate_tokens(text) + MESSAGE_OVERHEAD_TOKENS
+                self.truncated += 1
+            remaining -= tokens
+            current.append({"role": "user", "content": text})
+
+        preamble = []
+        if group_lines:
+            # What the group just said, newest lines first until the group share runs out
+            allowance = min(self.group_max_tokens, remaining) - self.group_header_tokens
+            kept: List[str] = []
+            for line in reversed(group_lines):
+                tokens = estimate_tokens(line) + 1
+                if tokens > allowance:
+                    break
+                allowance -= tokens
+                kept.append(line)
+            if kept:
+                content = GROUP_HEADER + "\n".join(reversed(kept))
+                preamble.append({"role": "system", "content": content})
+                remaining -= estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+        summary = record.summary if record else ""
+        if summary:
+            summary_message = {"role": "system", "content": f"Earlier with this person:\n{summary}"}
+            tokens = estimate_tokens(summary_message["content"]) + MESSAGE_OVERHEAD_TOKENS
+            if tokens <= remaining:
+                preamble.append(summary_message)
+                remaining -= tokens
+
+        # Newest exchanges first, stop at the first one that doesn't fit
+        history: List[Dict] = []
+        for exchange in reversed(record.recent if record else []):
+            user_text, bot_text = exchange.user, exchange.bot
+            tokens = estimate_tokens(user_text) + estimate_tokens(bot_text) + 2 * MESSAGE_OVERHEAD_TOKENS
+            if tokens > remaining:
+                break
+            remaining -= tokens
+            history[:0] = [
+                {"role": "user", "content": user_text},
+                {"role": "assistant", "content": bot_text}
+            ]
+
+        return [self.system_message] + preamble + history + current
+
+    def fold(self, record: UserRecord, max_history: int, fold_batch: int) -> int:
+        """
+        Move the oldest exchanges into the rolling summary once history passes max_history
+        Each folded exchange becomes one clipped line; oldest lines fall off the
+        summary when it outgrows summary_max_tokens. Returns how many were folded
+        """
+        recent = record.recent
+        if len(recent) <= max_history:
+            return 0
+
+        count = max(len(recent) - max_history, min(fold_batch, len(recent)))
+        folded: List[Exchange] = recent[:count]
+        del recent[:count]
+
+        lines = record.summary.splitlines()
+        for exchange in folded:
+            lines.append(
+                f"- they said: {clip(exchange.user, self.clip_chars)} / "
+                f"you said: {clip(exchange.bot, self.clip_chars)}"
+            )
+        while lines and estimate_tokens("\n".join(lines)) > self.summary_max_tokens:
+            lines.pop(0)
+        record.summary = "\n".join(lines)
+        return len(folded)
@@ -0,0 +1,163 @@
+"""
+Non-blocking conversation logger
+Entries are queued from the event loop and written in batches by a background
+thread holding a single open file handle, with size/time rotation
+"""
+
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DROP_NEW = "drop_new"  # Discard the incoming entry when the queue is full
+DROP_OLD = "drop_old"  # Discard the oldest queued entry to make room
+
+_STOP = object()
+
+
+class ConversationLogger:
+    """Queue-backed JSON-lines writer with batching, rotation and drop counters"""
+
+    def __init__(self, path: str, max_queue: int = 10000, batch_size: int = 200,
+                 flush_interval: float = 1.0, rotate_bytes: int = 0, rotate_seconds: float = 0,
+                 compress: bool = False, drop_policy: str = DROP_NEW):
+        if drop_policy not in (DROP_NEW, DROP_OLD):
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compress = compress
+        self.drop_policy = drop_policy
+        self.lines_written = 0
+        self.lines_dropped = 0
+        self.rotations = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._opened_at = 0.0
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="conversation-logger", daemon=True)
+            self._thread.start()
+
+    def log(self, entry: Dict) -> bool:
+        """Queue an entry without blocking, returns False if something was dropped"""
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            pass
+
+        self.lines_dropped += 1
+        if self.drop_policy == DROP_OLD:
+            try:
+                self._queue.get_nowait()
+                self._queue.put_nowait(entry)
+            except (queue.Empty, queue.Full):
+                pass
+        return False
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Write everything still queued and stop the writer thread"""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            # The writer is stuck or gone, make room rather than hang shutdown
+            try:
+                self._queue.get_nowait()
+                self.lines_dropped += 1
+                self._queue.put_nowait(_STOP)
+            except (queue.Empty, queue.Full):
+                pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            try:
+                batch: List = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                self._rotate_if_due()
+                continue
+
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if _STOP in batch:
+                stopping = True
+                batch = [entry for entry in batch if entry is not _STOP]
+
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                self.lines_dropped += len(batch)
+                logger.error(f"Failed to write conversation log: {e}")
+
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _write_batch(self, batch: List[Dict]) -> None:
+        if not batch:
+            return
+        if self._file is None:
+            self._open()
+        self._file.write("".join(json.dumps(entry) + "\n" for entry in batch))
+        self._file.flush()
+        self.lines_written += len(batch)
+        self._rotate_if_due()
+
+    def _open(self) -> None:
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._opened_at = time.time()
+
+    def _rotate_if_due(self) -> None:
+        """Rotation errors (disk full, ...) are logged, they must not kill the writer thread"""
+        try:
+            self._maybe_rotate()
+        except Exception as e:
+            logger.error(f"Failed to rotate conversation log: {e}")
+
+    def _maybe_rotate(self) -> None:
+        if self._file is None:
+            return
+        too_big = self.rotate_bytes and self._file.tell() >= self.rotate_bytes
+        too_old = self.rotate_seconds and time.time() - self._opened_at >= self.rotate_seconds
+        if not (too_big or too_old):
+            return
+
+        self._file.close()
+        self._file = None
+        if os.path.getsize(self.path) == 0:
+            return  # Nothing worth keeping, just restart the time window
+
+        rotated = f"{self.path}.{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        if os.path.exists(rotated) or os.path.exists(rotated + ".gz"):
+            rotated += f".{self.rotations}"  # Several rotations within the same second
+        os.replace(self.path, rotated)
+        if self.compress:
+            with open(rotated, 'rb') as src, gzip.open(rotated + ".gz", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.unlink(rotated)
+        self.rotations += 1
@@ -0,0 +1,82 @@
+"""
+Shared context for group chats
+A fixed-size ring buffer of recent messages per group, including ones the bot
+doesn't answer, so a mention can be answered knowing what was just said.
+Inactive groups are evicted least-recently-used first
+"""
+
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Set
+
+
+class GroupMessage:
+    __slots__ = ("message_id", "user_id", "name", "text", "at", "from_bot")
+
+    def __init__(self, message_id: int, user_id: int, name: str, text: str, at: int, from_bot: bool):
+        self.message_id = message_id
+        self.user_id = user_id
+        self.name = name
+        self.text = text
+        self.at = at  # Epoch seconds
+        self.from_bot = from_bot
+
+
+class GroupContext:
+    """Per-chat ring buffers with bounded size per chat and LRU eviction across chats"""
+
+    def __init__(self, max_messages: int, max_chats: int, max_chars: int):
+        self.max_messages = max_messages
+        self.max_chats = max_chats
+        self.max_chars = max_chars
+        self._chats: "OrderedDict[int, Deque[GroupMessage]]" = OrderedDict()
+        self.recorded = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+    def record(self, chat_id: int, message_id: int, user_id: int, name: str, text: str,
+               from_bot: bool = False) -> None:
+        """
+        Remember a group message; bot replies are recorded with the id of the
+        message they answer so they sort before anything newer
+        """
+        buffer = self._chats.get(chat_id)
+        if buffer is None:
+            buffer = self._chats[chat_id] = deque(maxlen=self.max_messages)
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._chats.move_to_end(chat_id)
+        buffer.append(GroupMessage(message_id, user_id, name, text[:self.max_chars], int(time.time()), from_bot))
+        self.recorded += 1
+
+    def lines_before(self, chat_id: int, message_id: int, user_id: int,
+                     skip_texts: Optional[Set[str]] = None) -> List[str]:
+        """
+        "name: text" lines said before message_id, oldest first
+        The asking user's own messages in skip_texts (a coalesced burst) are left out,
+        they're already part of the request
+        """
+        buffer = self._chats.get(chat_id)
+        if not buffer:
+            return []
+        skip = {text[:self.max_chars] for text in skip_texts or ()}
+        lines = []
+        for entry in buffer:
+            if entry.message_id >= message_id:
+                continue
+            if entry.user_id == user_id and entry.text in skip:
+                continue
+            lines.append(f"you: {entry.text}" if entry.from_bot else f"{entry.name}: {entry.text}")
+        return lines
+
+    def stats(self) -> Dict:
+        return {
+            "chats": len(self._chats),
+            "messages": sum(len(buffer) for buffer in self._chats.values()),
+            "recorded": self.recorded,
+            "evictions": self.evictions
+        }
@@ -0,0 +1,89 @@
+"""
+Shared HTTP connection pool for the completions API
+One long-lived aiohttp session per bot so replies reuse warm TCP/TLS connections
+"""
+
+import logging
+from typing import Dict
+
+import aiohttp
+
+from config import (
+    API_CONNECT_TIMEOUT, API_READ_TIMEOUT, API_POOL_LIMIT, API_POOL_LIMIT_PER_HOST,
+    API_KEEPALIVE_TIMEOUT, API_DNS_CACHE_TTL
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats:
+    """Connection pool usage counters collected through aiohttp request tracing"""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.request_errors = 0
+
+    async def _on_request_start(self, session, ctx, params) -> None:
+        self.requests += 1
+
+    async def _on_connection_create_end(self, session, ctx, params) -> None:
+        self.connections_created += 1
+
+    async def _on_connection_reuseconn(self, session, ctx, params) -> None:
+        self.connections_reused += 1
+
+    async def _on_request_exception(self, session, ctx, params) -> None:
+        self.request_errors += 1
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """Build a TraceConfig that feeds these counters"""
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(self._on_request_start)
+        trace.on_connection_create_end.append(self._on_connection_create_end)
+        trace.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        trace.on_request_exception.append(self._on_request_exception)
+        return trace
+
+
+def create_session(stats: PoolStats) -> aiohttp.ClientSession:
+    """Create the pooled session used for every upstream API call"""
+    connector = aiohttp.TCPConnector(
+        limit=API_POOL_LIMIT,
+        limit_per_host=API_POOL_LIMIT_PER_HOST,
+        keepalive_timeout=API_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=API_DNS_CACHE_TTL,
+        enable_cleanup_closed=True
+    )
+    logger.info(
+        f"HTTP pool ready (limit={API_POOL_LIMIT}, per_host={API_POOL_LIMIT_PER_HOST}, "
+        f"keepalive={API_KEEPALIVE_TIMEOUT}s, dns_ttl={API_DNS_CACHE_TTL}s)"
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        # No total timeout here, the resilience layer owns the overall deadline
+        timeout=aiohttp.ClientTimeout(
+            total=None, sock_connect=API_CONNECT_TIMEOUT, sock_read=API_READ_TIMEOUT
+        ),
+        trace_configs=[stats.trace_config()]
+    )
+
+
+def pool_usage(session: aiohttp.ClientSession, stats: PoolStats) -> Dict:
+    """Snapshot of pool occupancy plus the traced counters"""
+    in_use = idle = 0
+    connector = session.connector if session and not session.closed else None
+    if isinstance(connector, aiohttp.TCPConnector):
+        # aiohttp has no public accessor for these, read the connector state directly
+        in_use = len(getattr(connector, "_acquired", ()))
+        idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+    return {
+        "in_use": in_use,
+        "idle": idle,
+        "limit": API_POOL_LIMIT,
+        "requests": stats.requests,
+        "connections_created": stats.connections_created,
+        "connections_reused": stats.connections_reused,
+        "request_errors": stats.request_errors
+    }
@@ -0,0 +1,326 @@
+"""
+Pluggable conversation memory storage
+Only recently active users are kept in RAM as compact records; the rest stay
+in the backend (cold storage) and are loaded on demand. Per-user incremental
+writes are batched by a background write-behind flusher
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from config import MEMORY_BACKEND, MEMORY_FILE, MEMORY_DB_FILE, MEMORY_SEED_FILE, SHARD_COUNT, SHARD_INDEX
+from user_record import UserRecord, to_epoch
+
+logger = logging.getLogger(__name__)
+
+
+def read_legacy_json(path: str) -> Dict:
+    """Read the original anikah_memory.json format"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def key_shard(user_key: str, count: int) -> int:
+    """
+    Shard a memory key lives on, the same modulo sharding.shard_for applies to updates
+    Private keys are the user id (which is the chat id), group keys chat_id:user_id
+    """
+    try:
+        return int(user_key.split(":", 1)[0]) % count
+    except ValueError:
+        return 0  # Unknown key format, kept on the first shard rather than dropped
+
+
+def shard_key_filter() -> Optional[Callable[[str], bool]]:
+    """Keeps only this shard's keys when copying an unsharded store, None when not sharded"""
+    if SHARD_COUNT <= 1:
+        return None
+    return lambda user_key: key_shard(user_key, SHARD_COUNT) == SHARD_INDEX
+
+
+class JsonSnapshotBackend:
+    """
+    Whole-file JSON backend kept for compatibility
+    Only dirty users are re-serialized, and the file is replaced atomically
+    (temp file + fsync + rename) so a crash never leaves it truncated
+    """
+
+    name = "json"
+
+    def __init__(self, path: str, seed_file: Optional[str] = None,
+                 key_filter: Optional[Callable[[str], bool]] = None):
+        self.path = path
+        self.seed_file = seed_file  # Read instead while path doesn't exist yet (a new shard)
+        self.key_filter = key_filter
+        self._rows: Dict[str, str] = {}  # user_key -> serialized record
+
+    def load_recent(self, limit: int) -> List[Tuple[str, Dict]]:
+        """Read the whole file, keep every user serialized and return the most recently active ones"""
+        if not os.path.exists(self.path) and self.seed_file and os.path.exists(self.seed_file):
+            memory = read_legacy_json(self.seed_file)
+            if self.key_filter:
+                memory = {key: value for key, value in memory.items() if self.key_filter(key)}
+            logger.info(f"Seeding {self.path} with {len(memory)} users from {self.seed_file}")
+        else:
+            memory = read_legacy_json(self.path)
+        self._rows = {key: json.dumps(value, ensure_ascii=False) for key, value in memory.items()}
+        recent = sorted(memory.items(), key=lambda item: to_epoch(item[1].get("last_interaction")))
+        return recent[-limit:] if limit > 0 else []
+
+    def load_user(self, user_key: str) -> Optional[Dict]:
+        row = self._rows.get(user_key)
+        return json.loads(row) if row is not None else None
+
+    def count(self) -> int:
+        return len(self._rows)
+
+    def write_users(self, rows: Dict[str, str]) -> None:
+        self._rows.update(rows)
+        body = ",\n".join(f"{json.dumps(key)}: {row}" for key, row in self._rows.items())
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".anikah_memory.", dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write("{\n" + body + "\n}")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteBackend:
+    """SQLite backend in WAL mode, one row per user so writes stay incremental"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, legacy_json: Optional[str] = None, seed_db: Optional[str] = None,
+                 key_filter: Optional[Callable[[str], bool]] = None):
+        self.path = path
+        self.legacy_json = legacy_json
+        self.seed_db = seed_db  # Unsharded database a new shard copies from, ahead of the legacy JSON
+        self.key_filter = key_filter  # Which keys to take from either of them
+        # Only the flusher thread writes after load, one at a time
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            "user_key TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS users_updated_at ON users (updated_at)")
+        self.conn.commit()
+        # Separate connection for on-demand reads from the event loop, WAL lets it run beside a write
+        self.reader = sqlite3.connect(path, check_same_thread=False)
+
+    def load_recent(self, limit: int) -> List[Tuple[str, Dict]]:
+        """
+        The most recently written users, oldest first
+        An empty table is first filled from the seed database, or else the legacy JSON
+        """
+        if not self.count():
+            if self.seed_db and os.path.exists(self.seed_db):
+                self._import(self._read_seed_db(), self.seed_db)
+            elif self.legacy_json and os.path.exists(self.legacy_json):
+                memory = read_legacy_json(self.legacy_json)
+                now = time.time()
+                self._import([
+                    (key, json.dumps(value, ensure_ascii=False), to_epoch(value.get("last_interaction")) or now)
+                    for key, value in memory.items()
+                ], self.legacy_json)
+
+        rows = self.reader.execute(
+            "SELECT user_key, data FROM users ORDER BY updated_at DESC LIMIT ?", (max(limit, 0),)
+        ).fetchall()
+        return [(key, json.loads(data)) for key, data in reversed(rows)]
+
+    def _read_seed_db(self) -> List[Tuple[str, str, float]]:
+        seed = sqlite3.connect(f"file:{os.path.abspath(self.seed_db)}?mode=ro", uri=True)
+        try:
+            return seed.execute("SELECT user_key, data, updated_at FROM users").fetchall()
+        finally:
+            seed.close()
+
+    def _import(self, rows: List[Tuple[str, str, float]], source: str) -> None:
+        if self.key_filter:
+            rows = [row for row in rows if self.key_filter(row[0])]
+        with self.conn:
+            self.conn.executemany("INSERT INTO users (user_key, data, updated_at) VALUES (?, ?, ?)", rows)
+        logger.info(f"Imported {len(rows)} users from {source} into {self.path}")
+
+    def load_user(self, user_key: str) -> Optional[Dict]:
+        row = self.reader.execute("SELECT data FROM users WHERE user_key = ?", (user_key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def count(self) -> int:
+        return self.reader.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def write_users(self, rows: Dict[str, str]) -> None:
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO users (user_key, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                [(key, row, now) for key, row in rows.items()]
+            )
+
+    def close(self) -> None:
+        self.reader.close()
+        self.conn.close()
+
+
+def create_backend():
+    """Build the backend selected by MEMORY_BACKEND"""
+    key_filter = shard_key_filter()
+    if MEMORY_BACKEND == "json":
+        return JsonSnapshotBackend(MEMORY_FILE, seed_file=MEMORY_SEED_FILE, key_filter=key_filter)
+    if MEMORY_BACKEND == "sqlite":
+        return SqliteBackend(MEMORY_DB_FILE, legacy_json=MEMORY_FILE, seed_db=MEMORY_SEED_FILE, key_filter=key_filter)
+    raise ValueError(f"Unknown MEMORY_BACKEND: {MEMORY_BACKEND}")
+
+
+class MemoryStore:
+    """
+    Hot LRU of user records in front of a backend, with write-behind flushing
+    Callers mark users dirty, a background task flushes them in batches off the
+    event loop and then evicts clean users that are idle or over the hot limit
+    """
+
+    def __init__(self, backend, flush_interval: float, hot_max_users: int = 0, idle_ttl: float = 0,
+                 on_flush: Optional[Callable[[float, int], None]] = None):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.hot_max_users = hot_max_users  # 0 = no limit
+        self.idle_ttl = idle_ttl  # 0 = never evict for idleness
+        self.on_flush = on_flush  # Called with (seconds, rows) after every write
+        self.hot: "OrderedDict[str, UserRecord]" = OrderedDict()  # Least recently used first
+        self._dirty: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.flushes = 0
+        self.rows_written = 0
+        self.last_flush_seconds = 0.0
+        self.cold_loads = 0
+        self.evictions = 0
+
+    def load(self, preload: int) -> int:
+        """Warm the hot set with the most recently active users, the rest load lazily"""
+        for user_key, data in self.backend.load_recent(preload):
+            self.hot[user_key] = UserRecord.from_dict(data)
+        return len(self.hot)
+
+    async def warm(self, preload: int) -> int:
+        """load() with the backend read (and any legacy import) done off the event loop"""
+        rows = await asyncio.to_thread(self.backend.load_recent, preload)
+        for user_key, data in rows:
+            self.hot[user_key] = UserRecord.from_dict(data)
+        return len(self.hot)
+
+    def get(self, user_key: str) -> Optional[UserRecord]:
+        """Hot record, or one read from cold storage (a single indexed row) on a miss"""
+        record = self.hot.get(user_key)
+        if record is not None:
+            self.hot.move_to_end(user_key)
+            return record
+        data = self.backend.load_user(user_key)
+        if data is None:
+            return None
+        record = self.hot[user_key] = UserRecord.from_dict(data)
+        self.cold_loads += 1
+        return record
+
+    def add(self, user_key: str, record: UserRecord) -> None:
+        self.hot[user_key] = record
+        self.mark_dirty(user_key)
+
+    def mark_dirty(self, user_key: str) -> None:
+        self._dirty.add(user_key)
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    def evict(self) -> int:
+        """Drop clean least recently used users that are idle or over the hot limit"""
+        now = time.time()
+        evicted = 0
+        while self.hot:
+            user_key, record = next(iter(self.hot.items()))
+            over_limit = self.hot_max_users and len(self.hot) > self.hot_max_users
+            idle = self.idle_ttl and now - record.last_seen >= self.idle_ttl
+            if not (over_limit or idle) or user_key in self._dirty:
+                break  # Dirty ones go after the next flush writes them
+            del self.hot[user_key]
+            evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def start(self) -> None:
+        """Start the periodic flusher"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def flush(self) -> int:
+        """Write every dirty user now, returns the number of rows written"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+
+            keys, self._dirty = self._dirty, set()
+            # Serialize on the loop so the thread never sees a record mid-update
+            rows = {
+                key: json.dumps(self.hot[key].to_dict(), ensure_ascii=False)
+                for key in keys if key in self.hot
+            }
+
+            start_time = time.monotonic()
+            try:
+                await asyncio.to_thread(self.backend.write_users, rows)
+            except Exception:
+                self._dirty.update(keys)  # Retry on the next flush
+                raise
+
+            self.last_flush_seconds = time.monotonic() - start_time
+            self.flushes += 1
+            self.rows_written += len(rows)
+            if self.on_flush:
+                self.on_flush(self.last_flush_seconds, len(rows))
+            return len(rows)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                self.evict()
+            except Exception as e:
+                logger.error(f"Failed to flush memory: {e}")
+
+    async def close(self) -> None:
+        """Stop the flusher, write what's left and close the backend"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        finally:
+            self.backend.close()
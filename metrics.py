@@ -0,0 +1,252 @@
+"""
+Lightweight Prometheus-style instrumentation
+Counters, gauges and bucketed histograms rendered in the text exposition
+format, served from a small local aiohttp endpoint; /stats reads percentiles
+from the same histograms
+"""
+
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Seconds, spanning a fast cache hit up to the API deadline
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Gauge that is either set directly or read from a callback at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, help_text)
+        self.callback = callback
+        self._value = 0.0
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self._value -= amount
+
+    @property
+    def value(self) -> float:
+        return self.callback() if self.callback else self._value
+
+    def render(self) -> List[str]:
+        try:
+            value = self.value
+        except Exception as e:
+            logger.error(f"Gauge {self.name} callback failed: {e}")
+            return []
+        return super().render() + [f"{self.name} {_format_value(value)}"]
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size  # Per bucket, not cumulative; last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _HistogramSeries(len(self.buckets) + 1)
+        series.counts[bisect_left(self.buckets, value)] += 1  # First bound >= value, or +Inf
+        series.total += value
+        series.count += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start_time, **labels)
+
+    def count(self) -> int:
+        return sum(series.count for series in self._series.values())
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile across all label sets, interpolating inside buckets like histogram_quantile"""
+        counts = [0] * (len(self.buckets) + 1)
+        for series in self._series.values():
+            for i, bucket_count in enumerate(series.counts):
+                counts[i] += bucket_count
+        total = sum(counts)
+        if total == 0:
+            return None
+
+        rank = q * total
+        cumulative = 0
+        for i, bucket_count in enumerate(counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]  # Beyond the last bound, best we can say
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, series in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), series.counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le_label)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series.total)}")
+            lines.append(f"{self.name}_count{labels} {series.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric and renders the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._register(Gauge(name, help_text, callback))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class BotMetrics:
+    """The bot's hot-path instrumentation, gauges are wired up by the bot"""
+
+    def __init__(self):
+        self.registry = MetricsRegistry()
+        self.handle_seconds = self.registry.histogram(
+            "anikah_handle_message_seconds", "End-to-end handle_message latency", ("chat_type",)
+        )
+        self.api_seconds = self.registry.histogram(
+            "anikah_api_request_seconds", "Completions API attempt latency", ("upstream", "outcome")
+        )
+        self.telegram_seconds = self.registry.histogram(
+            "anikah_telegram_send_seconds", "Telegram send latency", ("method",)
+        )
+        self.memory_save_seconds = self.registry.histogram(
+            "anikah_memory_save_seconds", "Batched memory flush duration"
+        )
+        self.messages = self.registry.counter(
+            "anikah_messages_total", "Handled messages by chat type and outcome", ("chat_type", "outcome")
+        )
+        self.in_flight = self.registry.gauge(
+            "anikah_in_flight_requests", "Messages currently being handled"
+        )
+
+
+async def start_metrics_server(registry: MetricsRegistry, host: str, port: int) -> web.AppRunner:
+    """Serve GET /metrics on a local port, returns the runner for cleanup"""
+
+    async def metrics_handler(request: web.Request) -> web.Response:
+        return web.Response(
+            body=registry.render().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics endpoint on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,173 @@
+"""
+Outbound Telegram scheduling
+Every send goes through per-chat (stricter for groups) and global token
+buckets before it reaches the Bot API. Flood-wait (429 retry_after) pauses the
+chat and the send is retried; droppable calls like typing actions and
+intermediate stream edits are skipped instead of waiting for a slot
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from telegram.constants import ChatAction
+from telegram.error import RetryAfter
+
+from rate_limit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class SendQueue:
+    """Paces Bot API calls to stay under Telegram's flood limits"""
+
+    def __init__(self, chat: RateLimiter, group: RateLimiter, global_: RateLimiter,
+                 max_retries: int, typing_ttl: float,
+                 observe: Optional[Callable[[str, float], None]] = None):
+        self.chat = chat
+        self.group = group
+        self.global_ = global_
+        self.max_retries = max_retries
+        self.typing_ttl = typing_ttl
+        self.observe = observe  # Called with (method, seconds) for every call that reached Telegram
+        self._paused_until: Dict[int, float] = {}  # chat_id -> monotonic time flood-wait ends
+        self._typing_at: Dict[int, float] = {}
+        self.sent = 0
+        self.waited = 0.0
+        self.flood_waits = 0
+        self.skipped = 0  # Droppable calls not sent for lack of a slot
+        self.typing_deduped = 0
+
+    def _limiter(self, is_group: bool) -> RateLimiter:
+        return self.group if is_group else self.chat
+
+    def _wait_time(self, chat_id: int, is_group: bool, now: float) -> float:
+        paused_until = self._paused_until.get(chat_id, 0.0)
+        if paused_until and paused_until <= now:
+            del self._paused_until[chat_id]  # Flood wait over
+        return max(
+            paused_until - now,
+            self._limiter(is_group).wait_time(chat_id, now),
+            self.global_.wait_time(None, now)
+        )
+
+    def _take(self, chat_id: int, is_group: bool, now: float) -> None:
+        limiter = self._limiter(is_group)
+        limiter.sweep(now)
+        limiter.consume(chat_id)
+        self.global_.consume(None)
+
+    async def _call(self, method: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        start_time = time.monotonic()
+        try:
+            return await call()
+        finally:
+            self.sent += 1
+            if self.observe:
+                self.observe(method, time.monotonic() - start_time)
+
+    def _flood_wait(self, chat_id: int, error: RetryAfter) -> None:
+        self.flood_waits += 1
+        now = time.monotonic()
+        if len(self._paused_until) > 10000:
+            self._paused_until = {key: until for key, until in self._paused_until.items() if until > now}
+        self._paused_until[chat_id] = now + error.retry_after
+        logger.warning(f"Telegram flood wait of {error.retry_after}s for chat {chat_id}")
+
+    async def send(self, chat_id: int, is_group: bool, call: Callable[[], Awaitable[Any]],
+                   method: str = "sendMessage") -> Any:
+        """Wait for a slot and make the call, retrying after flood waits"""
+        for attempt in range(self.max_retries + 1):
+            while True:
+                now = time.monotonic()
+                wait = self._wait_time(chat_id, is_group, now)
+                if wait <= 0:
+                    break
+                self.waited += wait
+                await asyncio.sleep(wait)
+            self._take(chat_id, is_group, now)
+
+            try:
+                return await self._call(method, call)
+            except RetryAfter as e:
+                self._flood_wait(chat_id, e)
+                if attempt == self.max_retries:
+                    raise
+
+    async def send_if_free(self, chat_id: int, is_group: bool, call: Callable[[], Awaitable[Any]],
+                           method: str) -> bool:
+        """Make a droppable call only if a slot is free right now, returns whether it was sent"""
+        now = time.monotonic()
+        if self._wait_time(chat_id, is_group, now) > 0:
+            self.skipped += 1
+            return False
+        self._take(chat_id, is_group, now)
+        try:
+            await self._call(method, call)
+        except RetryAfter as e:
+            self._flood_wait(chat_id, e)
+            return False
+        return True
+
+    async def send_typing(self, bot, chat_id: int, is_group: bool) -> bool:
+        """Typing indicator, skipped while one sent recently is still showing"""
+        now = time.monotonic()
+        if now - self._typing_at.get(chat_id, float("-inf")) < self.typing_ttl:
+            self.typing_deduped += 1
+            return False
+        if len(self._typing_at) > 10000:
+            self._typing_at = {key: at for key, at in self._typing_at.items() if now - at < self.typing_ttl}
+        sent = await self.send_if_free(
+            chat_id, is_group, lambda: bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING),
+            "sendChatAction"
+        )
+        if sent:
+            self._typing_at[chat_id] = now
+        return sent
+
+    def stats(self) -> Dict:
+        return {
+            "sent": self.sent,
+            "waited": self.waited,
+            "flood_waits": self.flood_waits,
+            "skipped": self.skipped,
+            "typing_deduped": self.typing_deduped
+        }
+
+
+class MediaCache:
+    """Telegram file_ids of uploaded local files, persisted so each file is uploaded once"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file_ids: Dict[str, str] = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._file_ids = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to read media cache {path}: {e}")
+
+    def get(self, name: str) -> Optional[str]:
+        return self._file_ids.get(name)
+
+    def put(self, name: str, file_id: str) -> None:
+        self._file_ids[name] = file_id
+        self._save()
+
+    def forget(self, name: str) -> None:
+        if self._file_ids.pop(name, None) is not None:
+            self._save()
+
+    def _save(self) -> None:
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._file_ids, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Failed to save media cache {self.path}: {e}")
@@ -0,0 +1,166 @@
+"""
+Rate limiting and request coalescing
+Token buckets per user, per chat and globally, plus a coalescer that folds a
+burst of messages from one user into a single completion call
+"""
+
+import asyncio
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+SCOPE_USER = "user"
+SCOPE_CHAT = "chat"
+SCOPE_GLOBAL = "global"
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    """Token buckets keyed by id, buckets idle longer than idle_ttl are dropped"""
+
+    def __init__(self, rate: float, burst: float, idle_ttl: float):
+        self.rate = rate
+        self.burst = burst
+        self.idle_ttl = idle_ttl
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._last_sweep = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _refill(self, key: Hashable, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.burst, now)
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+        return bucket
+
+    def available(self, key: Hashable, now: float) -> bool:
+        return self._refill(key, now).tokens >= 1
+
+    def wait_time(self, key: Hashable, now: float) -> float:
+        """Seconds until key has a token, 0 when it has one now"""
+        tokens = self._refill(key, now).tokens
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def consume(self, key: Hashable) -> None:
+        self._buckets[key].tokens -= 1
+
+    def sweep(self, now: float) -> int:
+        """Drop idle buckets, they would be full again anyway"""
+        if now - self._last_sweep < self.idle_ttl:
+            return 0
+        self._last_sweep = now
+        idle = [key for key, bucket in self._buckets.items() if now - bucket.updated >= self.idle_ttl]
+        for key in idle:
+            del self._buckets[key]
+        return len(idle)
+
+
+class RequestThrottle:
+    """Admits a request only if the user, chat and global buckets all have a token"""
+
+    def __init__(self, user: RateLimiter, chat: RateLimiter, global_: RateLimiter):
+        self._limiters = ((SCOPE_USER, user), (SCOPE_CHAT, chat), (SCOPE_GLOBAL, global_))
+        self.throttled: Dict[str, int] = {SCOPE_USER: 0, SCOPE_CHAT: 0, SCOPE_GLOBAL: 0}
+
+    def check(self, user_id: int, chat_id: int) -> Optional[str]:
+        """Consume a token from every scope, or return the scope that ran out"""
+        now = time.monotonic()
+        keys = {SCOPE_USER: user_id, SCOPE_CHAT: chat_id, SCOPE_GLOBAL: None}
+        for scope, limiter in self._limiters:
+            limiter.sweep(now)
+            if not limiter.available(keys[scope], now):
+                self.throttled[scope] += 1
+                return scope
+        for scope, limiter in self._limiters:
+            limiter.consume(keys[scope])
+        return None
+
+    @property
+    def tracked(self) -> int:
+        return sum(len(limiter) for _, limiter in self._limiters)
+
+
+class _Burst:
+    __slots__ = ("messages", "last_at", "prev_at")
+
+    def __init__(self):
+        self.messages: List[Tuple[int, str]] = []  # Unanswered (message_id, text), oldest first
+        self.last_at = 0.0  # Arrival of the newest message
+        self.prev_at = 0.0  # Arrival of the one before it, answered or not
+
+
+class BurstCoalescer:
+    """
+    Folds rapid messages from one user in one chat into a single completion
+    Messages are noted as they arrive; when one gets its turn and a newer one
+    from the same burst is already waiting, it steps aside and the newest
+    message answers for all of them
+    """
+
+    def __init__(self, window: float, max_batch: int):
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self._bursts: Dict[Tuple[int, int], _Burst] = {}
+        self._last_sweep = time.monotonic()
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._bursts)
+
+    def note(self, chat_id: int, user_id: int, message_id: int, text: str) -> None:
+        """Record an arriving message, safe to call more than once per message"""
+        self._sweep()
+        burst = self._bursts.get((chat_id, user_id))
+        if burst is None:
+            burst = self._bursts[(chat_id, user_id)] = _Burst()
+        if burst.messages and message_id <= burst.messages[-1][0]:
+            return  # Already noted, or older than the newest message (ids only grow per chat)
+        burst.messages.append((message_id, text))
+        del burst.messages[:-self.max_batch]
+        burst.prev_at, burst.last_at = burst.last_at, time.monotonic()
+
+    async def collect(self, chat_id: int, user_id: int, message_id: int, text: str) -> Optional[List[str]]:
+        """
+        Texts this message should answer (oldest first, itself last), or None
+        when a newer message from the same burst will answer instead
+        """
+        self.note(chat_id, user_id, message_id, text)
+        burst = self._bursts[(chat_id, user_id)]
+
+        # Only bursts wait for stragglers, a lone message goes straight through
+        in_burst = len(burst.messages) > 1 or burst.last_at - burst.prev_at < self.window
+        if self.window > 0 and in_burst:
+            while burst.messages and burst.messages[-1][0] == message_id:
+                remaining = burst.last_at + self.window - time.monotonic()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(remaining)
+
+        if not burst.messages or burst.messages[-1][0] != message_id:
+            self.coalesced += 1
+            return None
+
+        texts = [message_text for _, message_text in burst.messages]
+        burst.messages = []
+        return texts
+
+    def _sweep(self) -> None:
+        """Forget users whose last message is long gone"""
+        now = time.monotonic()
+        horizon = max(self.window, 1.0) * 60
+        if now - self._last_sweep < horizon:
+            return
+        self._last_sweep = now
+        stale = [key for key, burst in self._bursts.items() if not burst.messages and now - burst.last_at >= horizon]
+        for key in stale:
+            del self._bursts[key]
@@ -0,0 +1,277 @@
+"""
+Resilience layer for completions API calls
+Jittered exponential backoff honoring Retry-After, hedged requests past a
+latency percentile, and a circuit breaker that fails fast while the API is down
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504}
+# Bad key or wrong endpoint/model: the upstream is broken, not the request, so fail over right away
+UPSTREAM_FAULT_STATUSES = {401, 403, 404}
+
+
+class UpstreamError(Exception):
+    """Non-200 response from the completions API"""
+
+    def __init__(self, status: int, body: str = "", retry_after: Optional[float] = None):
+        super().__init__(f"API Error {status}: {body}")
+        self.status = status
+        self.body = body
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status in RETRYABLE_STATUSES
+
+    @property
+    def upstream_fault(self) -> bool:
+        """Counts against the upstream's health and is retried on another one"""
+        return self.retryable or self.status in UPSTREAM_FAULT_STATUSES
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the breaker is open"""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After header as seconds, accepts delta-seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, UpstreamError):
+        return error.upstream_fault
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+class RetryPolicy:
+    """Full-jitter exponential backoff, Retry-After takes precedence when given"""
+
+    def __init__(self, max_attempts: int, base_delay: float, max_delay: float):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker
+    Opens after failure_threshold consecutive failures, lets a single probe
+    through once recovery_timeout has passed. A probe that never reports back
+    (cancelled by a deadline, a hedge race or shutdown) expires after another
+    recovery_timeout so the breaker can't get stuck half-open
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, recovery_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == self.OPEN and now - self.opened_at >= self.recovery_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN and self._probe_in_flight and now - self._probe_started >= self.recovery_timeout:
+            logger.warning("Circuit breaker probe never finished, allowing another")
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            self._probe_started = now
+            return True
+        self.rejected += 1
+        return False
+
+    def release_probe(self) -> None:
+        """The attempt was abandoned without a result, let the next one probe"""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info("Circuit breaker closed, API is back")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(f"Circuit breaker opened after {self.consecutive_failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies for percentile lookups"""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class ResilientCaller:
+    """
+    Runs an API attempt factory with retries, hedging and an optional circuit breaker
+    Without a breaker here, attempts are expected to guard themselves (e.g. per upstream)
+    """
+
+    def __init__(self, retry: RetryPolicy, breaker: Optional[CircuitBreaker] = None,
+                 hedge_percentile: float = 0, hedge_min_samples: int = 20):
+        self.retry = retry
+        self.breaker = breaker
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latency = LatencyTracker()
+        self.attempts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    async def call(self, attempt: Callable[[], Awaitable[Any]], hedge: bool = True) -> Any:
+        """Call attempt() until it succeeds, the error isn't retryable or attempts run out"""
+        for attempt_no in range(self.retry.max_attempts):
+            if self.breaker and not self.breaker.allow():
+                raise CircuitOpenError("API circuit breaker is open")
+
+            try:
+                result = await (self._hedged(attempt) if hedge else self._timed(attempt))
+            except asyncio.CancelledError:
+                if self.breaker:
+                    self.breaker.release_probe()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    if self.breaker and isinstance(e, UpstreamError):
+                        self.breaker.record_success()  # Upstream answered, the request was bad
+                    raise
+                if self.breaker:
+                    self.breaker.record_failure()
+                if attempt_no + 1 >= self.retry.max_attempts:
+                    raise
+
+                if getattr(e, "status", None) in UPSTREAM_FAULT_STATUSES:
+                    delay = 0.0  # Waiting won't fix a bad key, the next attempt fails over
+                else:
+                    delay = self.retry.delay(attempt_no, getattr(e, "retry_after", None))
+                self.retries += 1
+                logger.warning(f"API attempt {attempt_no + 1} failed ({e!r}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            if self.breaker:
+                self.breaker.record_success()
+            return result
+
+    async def _timed(self, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        self.attempts += 1
+        start_time = time.monotonic()
+        result = await attempt()
+        self.latency.record(time.monotonic() - start_time)
+        return result
+
+    def hedge_delay(self) -> Optional[float]:
+        if self.hedge_percentile <= 0 or len(self.latency) < self.hedge_min_samples:
+            return None
+        return self.latency.percentile(self.hedge_percentile)
+
+    async def _hedged(self, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._timed(attempt)
+
+        primary = asyncio.ensure_future(self._timed(attempt))
+        pending: Set[asyncio.Future] = {primary}
+        error: Optional[BaseException] = None
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            # Primary is slower than usual, race a second copy against it
+            self.hedges += 1
+            hedge = asyncio.ensure_future(self._timed(attempt))
+            pending.add(hedge)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Loser (or everything, if we were cancelled) must not keep a connection busy
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict:
+        p95 = self.latency.percentile(95)
+        return {
+            **(self.breaker.stats() if self.breaker else {}),
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p95": p95 if p95 is not None else 0.0
+        }
@@ -0,0 +1,127 @@
+"""
+Response cache for repeated short prompts
+Keyed on a normalized message plus a hash of the recent context window, with
+TTL, LRU eviction, a memory cap and several candidate replies per key
+"""
+
+import hashlib
+import json
+import random
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from user_record import Exchange
+
+_MENTION_RE = re.compile(r"@\w+")
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_message(text: str) -> str:
+    """Lowercase, drop @mentions and punctuation, collapse whitespace"""
+    text = _MENTION_RE.sub(" ", text.lower())
+    text = _PUNCT_RE.sub(" ", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+class _CacheEntry:
+    __slots__ = ("responses", "expires_at", "size", "total_latency")
+
+    def __init__(self, expires_at: float, size: int):
+        self.responses: List[str] = []
+        self.expires_at = expires_at
+        self.size = size
+        self.total_latency = 0.0
+
+    @property
+    def avg_latency(self) -> float:
+        return self.total_latency / len(self.responses) if self.responses else 0.0
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of AI replies
+    A key only starts serving hits once it has collected `candidates` different
+    replies, then a random one is picked so answers don't feel robotic
+    """
+
+    def __init__(self, ttl: float, max_entries: int, max_bytes: int,
+                 candidates: int, max_message_chars: int, context_messages: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.candidates = max(1, candidates)
+        self.max_message_chars = max_message_chars
+        self.context_messages = context_messages
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+
+    def make_key(self, message: str, recent: List[Exchange]) -> Optional[str]:
+        """Cache key for a message, None when it isn't worth caching"""
+        normalized = normalize_message(message)
+        if not normalized or len(normalized) > self.max_message_chars:
+            return None
+
+        window = recent[-self.context_messages:] if self.context_messages > 0 else []
+        context = json.dumps([(exchange.user, exchange.bot) for exchange in window], ensure_ascii=False)
+        digest = hashlib.blake2b(context.encode('utf-8'), digest_size=8).hexdigest()
+        return f"{normalized}|{digest}"
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            entry = None
+
+        if entry is None or len(entry.responses) < self.candidates:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.saved_seconds += entry.avg_latency
+        return random.choice(entry.responses)
+
+    def put(self, key: str, response: str, latency: float) -> None:
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _CacheEntry(time.monotonic() + self.ttl, len(key.encode('utf-8')))
+            self.bytes += entry.size
+        self._entries.move_to_end(key)
+
+        if response in entry.responses or len(entry.responses) >= self.candidates:
+            return
+        entry.responses.append(response)
+        entry.total_latency += latency
+        size = len(response.encode('utf-8'))
+        entry.size += size
+        self.bytes += size
+        self._evict()
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "saved_seconds": self.saved_seconds
+        }
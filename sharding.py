@@ -0,0 +1,299 @@
+"""
+Sharded deployment
+A front process takes every update (getUpdates or its own webhook) and
+forwards it to one of SHARD_COUNT worker processes, picked by chat_id, so a
+chat's memory, ordering and rate limits all live on one worker. Workers are
+ordinary AnikahBot processes in webhook mode on 127.0.0.1:SHARD_BASE_PORT + i
+with their own memory, state and log files (a new shard's memory starts as
+its slice of the unsharded store); with SHARD_WORKER_URLS they run elsewhere
+and the front only routes
+
+    SHARD_COUNT=4 python sharding.py
+"""
+
+import asyncio
+import hmac
+import logging
+import os
+import secrets
+import signal
+import sys
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from config import (
+    BOT_TOKEN, BOT_MODE, METRICS_PORT, MEMORY_BACKEND, MEMORY_FILE, MEMORY_DB_FILE, CONVERSATION_LOG,
+    MEDIA_CACHE_FILE, STATE_FILE, DROP_PENDING_UPDATES,
+    WEBHOOK_URL, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN, WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_REGISTER, SHARD_COUNT, SHARD_BASE_PORT, SHARD_WORKER_URLS, SHARD_QUEUE_LIMIT, TELEGRAM_BASE_URL
+)
+from webhook import SECRET_TOKEN_HEADER
+
+logger = logging.getLogger(__name__)
+
+POLL_TIMEOUT = 30  # getUpdates long-poll seconds
+RETRY_BACKOFF_MAX = 2.0  # Seconds between attempts to reach a worker that is down or shedding
+WORKER_RESTART_DELAY = 1.0
+
+
+def worker_urls() -> List[str]:
+    """Where each shard takes its updates, the same list in the front and every worker"""
+    if SHARD_WORKER_URLS:
+        return SHARD_WORKER_URLS
+    return [f"http://127.0.0.1:{SHARD_BASE_PORT + index}{WEBHOOK_PATH}" for index in range(SHARD_COUNT)]
+
+
+def route_key(update: Dict) -> int:
+    """The chat an update belongs to, or its sender when there is no chat (inline queries)"""
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        if "from" in value:
+            return value["from"]["id"]
+    return update.get("update_id", 0)
+
+
+def shard_for(update: Dict, count: int) -> int:
+    # Plain modulo, not hash(): it has to agree across processes and restarts
+    return route_key(update) % count
+
+
+def shard_path(path: str, index: int) -> str:
+    """anikah_memory.db -> anikah_memory.shard2.db"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{index}{ext}"
+
+
+class ShardRouter:
+    """Per-shard FIFO queues, each drained in order by one forwarder"""
+
+    def __init__(self, urls: List[str], secret_token: str, queue_limit: int):
+        self.urls = urls
+        self.secret_token = secret_token
+        self.queues: List[asyncio.Queue] = [asyncio.Queue(queue_limit) for _ in urls]
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._tasks: List[asyncio.Task] = []
+        self.forwarded = [0] * len(urls)
+        self.retries = [0] * len(urls)
+        self.dropped = 0
+
+    async def start(self) -> None:
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        self._tasks = [asyncio.create_task(self._forward(index)) for index in range(len(self.urls))]
+
+    async def route(self, update: Dict) -> None:
+        """Queue an update for its shard, waits while that shard's queue is full"""
+        await self.queues[shard_for(update, len(self.urls))].put(update)
+
+    def try_route(self, update: Dict) -> bool:
+        try:
+            self.queues[shard_for(update, len(self.urls))].put_nowait(update)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def _forward(self, index: int) -> None:
+        queue = self.queues[index]
+        headers = {SECRET_TOKEN_HEADER: self.secret_token}
+        while True:
+            update = await queue.get()
+            backoff = 0.1
+            # One at a time and retried in place, so a chat's updates reach the worker in order
+            while True:
+                try:
+                    async with self.session.post(self.urls[index], json=update, headers=headers) as response:
+                        status = response.status
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    status = None
+                if status == 200:
+                    self.forwarded[index] += 1
+                    break
+                if status in (400, 403):
+                    self.dropped += 1
+                    logger.error(f"Shard {index} refused update {update.get('update_id')} with {status}")
+                    break
+                self.retries[index] += 1
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, RETRY_BACKOFF_MAX)
+            queue.task_done()
+
+    async def drain(self) -> None:
+        """Wait for everything queued to reach its worker, then stop the forwarders"""
+        for queue in self.queues:
+            await queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.session.close()
+
+    def stats(self) -> Dict:
+        return {
+            "forwarded": list(self.forwarded),
+            "retries": list(self.retries),
+            "queued": [queue.qsize() for queue in self.queues],
+            "dropped": self.dropped
+        }
+
+
+class ShardFront:
+    """Takes updates from Telegram, hands them to the router and supervises local workers"""
+
+    def __init__(self, secret_token: str):
+        self.secret_token = secret_token
+        self.urls = worker_urls()
+        self.router = ShardRouter(self.urls, secret_token, SHARD_QUEUE_LIMIT)
+        self.api_url = f"{TELEGRAM_BASE_URL}{BOT_TOKEN}"
+        self.workers: Dict[int, asyncio.subprocess.Process] = {}
+        self._stopping = False
+        self._runner: Optional[web.AppRunner] = None
+
+    def worker_env(self, index: int) -> Dict[str, str]:
+        """Config for local worker i: webhook mode on its own port with its own files"""
+        env = dict(os.environ)
+        env.update({
+            "SHARD_INDEX": str(index),
+            "SHARD_COUNT": str(len(self.urls)),
+            "BOT_MODE": "webhook",
+            "WEBHOOK_HOST": "127.0.0.1",
+            "WEBHOOK_PORT": str(SHARD_BASE_PORT + index),
+            "WEBHOOK_SECRET_TOKEN": self.secret_token,
+            "WEBHOOK_REGISTER": "false",
+            "METRICS_PORT": str(METRICS_PORT + 1 + index) if METRICS_PORT else "0",
+            "MEMORY_DB_FILE": shard_path(MEMORY_DB_FILE, index),
+            "MEMORY_SEED_FILE": MEMORY_DB_FILE,  # A new shard copies its chats from the unsharded store
+            "STATE_FILE": shard_path(STATE_FILE, index),
+            "CONVERSATION_LOG": shard_path(CONVERSATION_LOG, index),
+            "MEDIA_CACHE_FILE": shard_path(MEDIA_CACHE_FILE, index)
+        })
+        if MEMORY_BACKEND == "json":
+            env["MEMORY_FILE"] = shard_path(MEMORY_FILE, index)  # The store itself, not just a legacy import
+            env["MEMORY_SEED_FILE"] = MEMORY_FILE
+        return env
+
+    async def _supervise(self, index: int) -> None:
+        """Run local worker i, restarting it if it exits before shutdown"""
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "anikah.py")
+        while not self._stopping:
+            process = await asyncio.create_subprocess_exec(sys.executable, script, env=self.worker_env(index))
+            self.workers[index] = process
+            logger.info(f"Shard {index} started (pid {process.pid}) on {self.urls[index]}")
+            code = await process.wait()
+            if not self._stopping:
+                logger.error(f"Shard {index} exited with {code}, restarting")
+                await asyncio.sleep(WORKER_RESTART_DELAY)
+
+    async def _call(self, session: aiohttp.ClientSession, method: str, **params) -> Dict:
+        async with session.post(f"{self.api_url}/{method}", json=params) as response:
+            return await response.json()
+
+    async def poll(self) -> None:
+        """getUpdates loop, an update is confirmed to Telegram once its shard has it queued"""
+        timeout = aiohttp.ClientTimeout(total=POLL_TIMEOUT + 10)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            await self._call(session, "deleteWebhook", drop_pending_updates=DROP_PENDING_UPDATES)
+            offset = 0
+            try:
+                while True:
+                    try:
+                        data = await self._call(session, "getUpdates", offset=offset, timeout=POLL_TIMEOUT)
+                    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                        logger.warning(f"getUpdates failed: {e}")
+                        await asyncio.sleep(1)
+                        continue
+                    if not data.get("ok"):
+                        retry_after = data.get("parameters", {}).get("retry_after", 1)
+                        logger.warning(f"getUpdates error: {data.get('description')}, retrying in {retry_after}s")
+                        await asyncio.sleep(retry_after)
+                        continue
+                    for update in data["result"]:
+                        await self.router.route(update)
+                        offset = update["update_id"] + 1
+            finally:
+                if offset:
+                    # Confirm what was routed so a restart doesn't fetch it again
+                    try:
+                        await self._call(session, "getUpdates", offset=offset, timeout=0, limit=1)
+                    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                        logger.warning(f"Could not confirm offset {offset}: {e}")
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_TOKEN_HEADER, "")
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            return web.Response(status=403)
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        # 503 makes Telegram retry later instead of the front buffering without bound
+        return web.Response() if self.router.try_route(update) else web.Response(status=503)
+
+    async def serve_webhook(self) -> None:
+        app = web.Application()
+        app.router.add_post(WEBHOOK_PATH, self.handle_update)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        logger.info(f"Front webhook listening on http://{WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+        if WEBHOOK_URL and WEBHOOK_REGISTER:
+            async with aiohttp.ClientSession() as session:
+                await self._call(
+                    session, "setWebhook", url=WEBHOOK_URL, secret_token=self.secret_token,
+                    max_connections=WEBHOOK_MAX_CONNECTIONS, drop_pending_updates=DROP_PENDING_UPDATES
+                )
+
+    async def run(self) -> None:
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except NotImplementedError:
+                pass
+
+        await self.router.start()
+        supervisors = []
+        if not SHARD_WORKER_URLS:
+            supervisors = [asyncio.create_task(self._supervise(index)) for index in range(len(self.urls))]
+        intake = None
+        if BOT_MODE == "webhook":
+            await self.serve_webhook()
+        else:
+            intake = asyncio.create_task(self.poll())
+        logger.info(f"Routing updates to {len(self.urls)} shards")
+
+        try:
+            await stop_event.wait()
+        finally:
+            logger.info("Stopping: draining shard queues")
+            self._stopping = True
+            if intake:
+                intake.cancel()
+                await asyncio.gather(intake, return_exceptions=True)
+            if self._runner:
+                await self._runner.cleanup()
+            await self.router.drain()
+            # Each worker drains and checkpoints on SIGTERM (see AnikahBot.run)
+            for process in self.workers.values():
+                if process.returncode is None:
+                    process.terminate()
+            await asyncio.gather(*supervisors, return_exceptions=True)
+            logger.info(f"Front stopped: {self.router.stats()}")
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - front - %(name)s - %(levelname)s - %(message)s')
+    secret_token = WEBHOOK_SECRET_TOKEN
+    if not secret_token:
+        if SHARD_WORKER_URLS:
+            raise SystemExit("WEBHOOK_SECRET_TOKEN is required with SHARD_WORKER_URLS")
+        secret_token = secrets.token_urlsafe(32)  # Only shared with the workers we start
+    asyncio.run(ShardFront(secret_token).run())
+
+
+if __name__ == "__main__":
+    main()
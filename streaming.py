@@ -0,0 +1,136 @@
+"""
+Streaming completions support
+Parses SSE chunks from the chat-completions endpoint and mirrors them into a
+Telegram message with coalesced, rate-limited edits
+"""
+
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+import aiohttp
+from telegram import Message
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+async def iter_chat_deltas(response: aiohttp.ClientResponse) -> AsyncIterator[str]:
+    """Yield content deltas from an OpenAI-compatible SSE stream, raises if it ends before [DONE]"""
+    async for raw_line in response.content:
+        line = raw_line.decode('utf-8', errors='ignore').strip()
+        if not line.startswith('data:'):
+            continue  # Blank keep-alives, comments and event names
+
+        data = line[5:].strip()
+        if data == '[DONE]':
+            break
+
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            logger.warning(f"Skipping malformed stream chunk: {data[:100]}")
+            continue
+
+        choices = chunk.get('choices') or []
+        if not choices:
+            continue
+        content = (choices[0].get('delta') or {}).get('content')
+        if content:
+            yield content
+    else:
+        raise aiohttp.ClientPayloadError("Stream closed before [DONE]")
+
+
+class StreamingReply:
+    """
+    Progressively edits a single reply as completion chunks arrive
+    First visible tokens are sent immediately, later chunks are coalesced so
+    edits happen at most once per edit_interval and only for min_chars of new text.
+    With a send queue, intermediate edits are skipped when no send slot is free
+    """
+
+    def __init__(self, message: Message, edit_interval: float, min_chars: int, send_queue=None):
+        self.message = message
+        self.edit_interval = edit_interval
+        self.min_chars = min_chars
+        self.send_queue = send_queue
+        self._is_group = message.chat.type != 'private'
+        self.text = ""
+        self.sent: Optional[Message] = None
+        self.first_token_at: Optional[float] = None
+        self.edits = 0
+        self._shown = ""
+        self._last_edit = 0.0
+
+    async def push(self, delta: str) -> None:
+        """Add a chunk and update the visible message if it's due"""
+        self.text += delta
+        if not self.text.strip():
+            return
+
+        if self.sent is None:
+            # Time-to-first-visible-token is what users feel, send right away
+            self.first_token_at = time.monotonic()
+            text = self.text
+            self.sent = await self._send(lambda: self.message.reply_text(text))
+            self._shown = self.text
+            self._last_edit = self.first_token_at
+            return
+
+        now = time.monotonic()
+        if (now - self._last_edit >= self.edit_interval and
+                len(self.text) - len(self._shown) >= self.min_chars):
+            try:
+                await self._edit(self.text, droppable=True)
+            except RetryAfter as e:
+                # Flood control, hold further edits back instead of failing the stream
+                self._last_edit = now + e.retry_after
+            except BadRequest as e:
+                logger.warning(f"Skipping stream edit: {e}")
+                self._last_edit = now
+
+    async def finish(self, fallback: str) -> str:
+        """Send the final text with markdown and return what the user sees"""
+        final_text = self.text.strip() or fallback
+
+        if self.sent is None:
+            try:
+                self.sent = await self._send(
+                    lambda: self.message.reply_text(final_text, parse_mode=ParseMode.MARKDOWN)
+                )
+            except BadRequest:
+                self.sent = await self._send(lambda: self.message.reply_text(final_text))
+            return final_text
+
+        # Re-render with markdown now that the text is complete
+        try:
+            await self._edit(final_text, parse_mode=ParseMode.MARKDOWN)
+        except BadRequest:
+            if final_text != self._shown:
+                await self._edit(final_text)
+        return final_text
+
+    async def _send(self, call: Callable[[], Awaitable[Any]], method: str = "sendMessage") -> Any:
+        if self.send_queue is None:
+            return await call()
+        return await self.send_queue.send(self.message.chat_id, self._is_group, call, method)
+
+    async def _edit(self, text: str, parse_mode: Optional[str] = None, droppable: bool = False) -> None:
+        call = lambda: self.sent.edit_text(text, parse_mode=parse_mode)
+        try:
+            if droppable and self.send_queue is not None:
+                # Not worth waiting for, the next chunk or finish() will show it
+                if not await self.send_queue.send_if_free(self.message.chat_id, self._is_group, call, "editMessageText"):
+                    self._last_edit = time.monotonic()
+                    return
+            else:
+                await self._send(call, "editMessageText")
+            self.edits += 1
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+        self._shown = text
+        self._last_edit = time.monotonic()
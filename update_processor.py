@@ -0,0 +1,148 @@
+"""
+Concurrent update processing with per-chat ordering
+Different chats are handled in parallel up to a global limit, updates from the
+same chat are processed strictly one after another
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class _KeyedSlot:
+    """Lock or semaphore shared by every waiter for one key, dropped when unused"""
+
+    __slots__ = ("primitive", "users")
+
+    def __init__(self, limit: int):
+        # asyncio.Lock hands out ownership in FIFO order, which keeps chats ordered
+        self.primitive = asyncio.Lock() if limit == 1 else asyncio.Semaphore(limit)
+        self.users = 0
+
+
+class ChatOrderedProcessor(BaseUpdateProcessor):
+    """
+    Update processor that serializes each chat and caps in-flight updates per user
+    Concurrency is limited by max_workers, taken only once an update holds its
+    chat lock, so a busy chat never ties up slots other chats need. A chat with
+    max_queued_per_chat updates already waiting or running drops newer ones.
+    on_arrival is called for every accepted update before it starts waiting, so
+    later stages can see what's queued behind it, and on_done once its handlers
+    have finished
+    """
+
+    def __init__(self, max_workers: int, per_user_limit: int, max_queued_per_chat: int,
+                 on_arrival: Optional[Callable[[object], None]] = None,
+                 on_done: Optional[Callable[[object], None]] = None):
+        # The base class semaphore is taken before the chat lock, so it must never run out
+        super().__init__(max_concurrent_updates=sys.maxsize)
+        self.max_queued_per_chat = max_queued_per_chat  # 0 = no limit
+        self.on_arrival = on_arrival
+        self.on_done = on_done
+        self.max_workers = max_workers
+        self.per_user_limit = per_user_limit
+        self._workers = asyncio.Semaphore(max_workers)
+        self._chat_slots: Dict[int, _KeyedSlot] = {}
+        self._user_slots: Dict[int, _KeyedSlot] = {}
+        self.queued = 0
+        self.in_flight = 0
+        self.processed = 0
+        self.dropped = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @staticmethod
+    def _keys(update: object) -> Tuple[Optional[int], Optional[int]]:
+        if not isinstance(update, Update):
+            return None, None
+        chat = update.effective_chat
+        user = update.effective_user
+        return (chat.id if chat else None), (user.id if user else None)
+
+    @asynccontextmanager
+    async def _hold(self, slots: Dict[int, _KeyedSlot], key: Optional[int], limit: int) -> AsyncIterator[None]:
+        if key is None:
+            yield
+            return
+
+        slot = slots.get(key)
+        if slot is None:
+            slot = slots[key] = _KeyedSlot(limit)
+        slot.users += 1
+        try:
+            async with slot.primitive:
+                yield
+        finally:
+            slot.users -= 1
+            if slot.users == 0:
+                del slots[key]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        chat_id, user_id = self._keys(update)
+        chat_slot = self._chat_slots.get(chat_id)
+        if self.max_queued_per_chat and chat_slot and chat_slot.users >= self.max_queued_per_chat:
+            self.dropped += 1
+            logger.warning(f"Chat {chat_id} already has {chat_slot.users} updates queued or running, dropping a newer one")
+            if asyncio.iscoroutine(coroutine):
+                coroutine.close()
+            return
+
+        enqueued_at = time.monotonic()
+        if self.on_arrival:
+            self.on_arrival(update)
+        self.queued += 1
+        started = False
+
+        try:
+            async with self._hold(self._chat_slots, chat_id, 1):
+                async with self._hold(self._user_slots, user_id, self.per_user_limit):
+                    async with self._workers:
+                        wait = time.monotonic() - enqueued_at
+                        self.queued -= 1
+                        started = True
+                        self.total_wait += wait
+                        self.max_wait = max(self.max_wait, wait)
+                        self.in_flight += 1
+                        try:
+                            await coroutine
+                        finally:
+                            self.in_flight -= 1
+                            self.processed += 1
+                            if self.on_done:
+                                self.on_done(update)
+        finally:
+            if not started:
+                self.queued -= 1
+                if asyncio.iscoroutine(coroutine):
+                    coroutine.close()  # Cancelled while waiting, never ran
+
+    @property
+    def backlog(self) -> int:
+        """Updates accepted and not finished yet, waiting or running"""
+        return self.queued + self.in_flight
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> Dict:
+        """Queue depth and wait-time snapshot for /stats"""
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "avg_wait": self.total_wait / self.processed if self.processed else 0.0,
+            "max_wait": self.max_wait,
+            "active_chats": len(self._chat_slots)
+        }
@@ -0,0 +1,164 @@
+"""
+Multi-endpoint routing for OpenAI-compatible completion APIs
+Each upstream has its own key, model, weight, concurrency limit and circuit
+breaker; requests go to the best scoring healthy upstream by EWMA latency and
+error rate, and fail over to the next one on errors
+"""
+
+import asyncio
+import logging
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+from resilience import CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+TIER_MAIN = "main"
+TIER_SMALL = "small"  # Short small talk, fine on a cheaper/faster model
+
+# Assumed latency for an upstream with no samples yet, low enough that it gets tried
+_UNKNOWN_LATENCY = 1.0
+
+
+class Upstream:
+    """One OpenAI-compatible endpoint and its live routing stats"""
+
+    def __init__(self, name: str, endpoint: str, api_key: str, model: str,
+                 weight: float = 1.0, max_concurrency: int = 32,
+                 tiers: Iterable[str] = (TIER_MAIN, TIER_SMALL),
+                 breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.model = model
+        self.weight = max(weight, 0.01)
+        self.max_concurrency = max_concurrency
+        self.tiers = set(tiers)
+        self.breaker = breaker
+        self.ewma_latency: Optional[float] = None
+        self.ewma_error = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    def headers(self) -> Dict:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    @property
+    def saturated(self) -> bool:
+        return self.in_flight >= self.max_concurrency
+
+    def score(self, error_penalty: float) -> float:
+        """Lower is better: expected latency inflated by errors and load, divided by weight"""
+        latency = self.ewma_latency if self.ewma_latency is not None else _UNKNOWN_LATENCY
+        load = 1 + self.in_flight / self.max_concurrency
+        return latency * (1 + error_penalty * self.ewma_error) * load / self.weight
+
+    async def acquire(self) -> None:
+        await self._slots.acquire()
+        self.in_flight += 1
+        self.requests += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+
+    def abandon(self) -> None:
+        """An attempt was cancelled before it had a result (deadline, lost hedge, shutdown)"""
+        if self.breaker:
+            self.breaker.release_probe()
+
+    def record(self, ok: bool, latency: float, alpha: float) -> None:
+        self.ewma_error = (1 - alpha) * self.ewma_error + alpha * (0.0 if ok else 1.0)
+        if ok:
+            if self.ewma_latency is None:
+                self.ewma_latency = latency
+            else:
+                self.ewma_latency = (1 - alpha) * self.ewma_latency + alpha * latency
+            if self.breaker:
+                self.breaker.record_success()
+        else:
+            self.failures += 1
+            if self.breaker:
+                self.breaker.record_failure()
+
+    def stats(self) -> Dict:
+        return {
+            "name": self.name,
+            "model": self.model,
+            "state": self.breaker.state if self.breaker else CircuitBreaker.CLOSED,
+            "ewma_latency": self.ewma_latency or 0.0,
+            "error_rate": self.ewma_error,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures
+        }
+
+
+class UpstreamPool:
+    """Latency/error aware router over a set of upstreams"""
+
+    def __init__(self, upstreams: List[Upstream], alpha: float, error_penalty: float):
+        if not upstreams:
+            raise ValueError("At least one API upstream is required")
+        self.upstreams = upstreams
+        self.alpha = alpha
+        self.error_penalty = error_penalty
+        self.failovers = 0
+
+    def pick(self, tier: str, exclude: Iterable[Upstream] = ()) -> Upstream:
+        """
+        Best healthy upstream for a tier, preferring ones with free slots
+        Falls back to every upstream when none is configured for the tier,
+        raises CircuitOpenError when all of them are open
+        """
+        skipped = set(exclude)
+        candidates = [u for u in self.upstreams if tier in u.tiers and u not in skipped]
+        if not candidates:
+            candidates = [u for u in self.upstreams if u not in skipped] or list(self.upstreams)
+
+        ranked = sorted(candidates, key=lambda u: (u.saturated, u.score(self.error_penalty)))
+        for upstream in ranked:
+            if upstream.breaker is None or upstream.breaker.allow():
+                # Moving past an upstream that just failed or is tripped counts as failover
+                if skipped or upstream is not ranked[0]:
+                    self.failovers += 1
+                return upstream
+        raise CircuitOpenError("Every API upstream is unavailable")
+
+    def stats(self) -> List[Dict]:
+        return [upstream.stats() for upstream in self.upstreams]
+
+
+def build_upstreams(configs: List[Dict], failure_threshold: int, recovery_timeout: float) -> List[Upstream]:
+    """Create upstreams from API_UPSTREAMS style dicts"""
+    upstreams = []
+    for index, cfg in enumerate(configs):
+        upstreams.append(Upstream(
+            name=cfg.get("name") or f"upstream-{index}",
+            endpoint=cfg["endpoint"],
+            api_key=cfg.get("api_key", ""),
+            model=cfg["model"],
+            weight=float(cfg.get("weight", 1.0)),
+            max_concurrency=int(cfg.get("max_concurrency", 32)),
+            tiers=cfg.get("tiers") or (TIER_MAIN, TIER_SMALL),
+            breaker=CircuitBreaker(failure_threshold, recovery_timeout)
+        ))
+    return upstreams
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def classify_tier(message: str, max_small_chars: int, help_keywords: Set[str]) -> str:
+    """Short chit-chat goes to the small tier, anything long or help-ish to main"""
+    if len(message) > max_small_chars:
+        return TIER_MAIN
+    if not help_keywords.isdisjoint(_WORD_RE.findall(message.lower())):
+        return TIER_MAIN
+    return TIER_SMALL
@@ -0,0 +1,70 @@
+"""
+Compact per-user conversation memory
+Slotted records with integer epoch timestamps instead of dicts of ISO strings;
+to_dict/from_dict convert to the stored JSON shape and still read the legacy one
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Union
+
+
+def to_epoch(value: Union[int, float, str, None]) -> int:
+    """Epoch seconds from a stored timestamp, legacy records use ISO strings"""
+    if value is None or value == "":
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except ValueError:
+        return 0
+
+
+class Exchange:
+    """One user message and the bot's reply"""
+
+    __slots__ = ("user", "bot", "at")
+
+    def __init__(self, user: str, bot: str, at: int):
+        self.user = user
+        self.bot = bot
+        self.at = at
+
+
+class UserRecord:
+    __slots__ = ("username", "first_seen", "last_seen", "message_count", "recent", "summary")
+
+    def __init__(self, username: str, first_seen: int, last_seen: Optional[int] = None,
+                 message_count: int = 0, recent: Optional[List[Exchange]] = None, summary: str = ""):
+        self.username = username
+        self.first_seen = first_seen
+        self.last_seen = last_seen if last_seen is not None else first_seen
+        self.message_count = message_count
+        self.recent = recent if recent is not None else []
+        self.summary = summary
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "UserRecord":
+        return cls(
+            username=data.get("username") or "Unknown",
+            first_seen=to_epoch(data.get("first_interaction")),
+            last_seen=to_epoch(data.get("last_interaction") or data.get("first_interaction")),
+            message_count=data.get("message_count", 0),
+            recent=[
+                Exchange(msg.get("user", ""), msg.get("bot", ""), to_epoch(msg.get("timestamp")))
+                for msg in data.get("recent_messages", [])
+            ],
+            summary=data.get("summary", "")
+        )
+
+    def to_dict(self) -> Dict:
+        data = {
+            "username": self.username,
+            "first_interaction": self.first_seen,
+            "last_interaction": self.last_seen,
+            "message_count": self.message_count,
+            "recent_messages": [{"user": ex.user, "bot": ex.bot, "timestamp": ex.at} for ex in self.recent]
+        }
+        if self.summary:
+            data["summary"] = self.summary
+        return data
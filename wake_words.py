@@ -0,0 +1,59 @@
+"""
+Compiled wake-word matcher for group chats
+Bot names and the @username are folded into one regex built once, with a
+cheap substring prefilter so the common no-mention message never hits the regex
+"""
+
+import re
+from typing import Iterable, Optional
+
+# Why the bot decided to answer, returned instead of a bare bool
+REASON_PRIVATE = "private"
+REASON_REPLY = "reply"
+REASON_USERNAME = "username"
+REASON_NAME = "name"
+
+
+class WakeWordMatcher:
+    """Single-pass matcher for BOT_NAMES and the bot's @username"""
+
+    def __init__(self, names: Iterable[str], bot_username: Optional[str] = None):
+        self.bot_username = bot_username
+        # Longest first so "anikah" wins over "ani" at the same position
+        unique_names = sorted({name.lower() for name in names if name}, key=len, reverse=True)
+
+        alternatives = []
+        literals = {name[:3] for name in unique_names}
+        if bot_username:
+            handle = f"@{bot_username.lower()}"
+            alternatives.append(f"(?P<username>{re.escape(handle)})")
+            literals.add(handle)
+        if unique_names:
+            alternatives.append("(?P<name>" + "|".join(re.escape(name) for name in unique_names) + ")")
+
+        # Any match must contain one of these, drop literals already covered by a shorter one
+        self._prefilter = tuple(sorted(
+            literal for literal in literals
+            if not any(other != literal and other in literal for other in literals)
+        ))
+        # Never matches anything when there's nothing to look for; text is lowercased before matching
+        pattern = r"(?<!\w)(?:" + "|".join(alternatives) + r")(?!\w)" if alternatives else r"(?!)"
+        self._regex = re.compile(pattern)
+
+    def match(self, text: Optional[str]) -> Optional[str]:
+        """Return the match reason ("username" or "name:<name>"), or None"""
+        if not text:
+            return None
+        lowered = text.lower()
+        for literal in self._prefilter:
+            if literal in lowered:
+                break
+        else:
+            return None
+
+        found = self._regex.search(lowered)
+        if not found:
+            return None
+        if found.lastgroup == "username":
+            return REASON_USERNAME
+        return f"{REASON_NAME}:{found.group('name').lower()}"
@@ -0,0 +1,112 @@
+"""
+Webhook serving mode
+Telegram POSTs updates to a local aiohttp server; each one is checked against
+the secret token, queued on the application and acknowledged right away, so
+a slow reply never holds up Telegram's delivery connection
+
+Recorded updates can be replayed locally:
+    curl -X POST http://127.0.0.1:8443/telegram \\
+         -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET_TOKEN" \\
+         -H "Content-Type: application/json" -d @update.json
+"""
+
+import hmac
+import logging
+from typing import Callable, Dict, Optional
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """Accepts webhook updates and feeds them to application.update_queue"""
+
+    def __init__(self, application: Application, host: str, port: int, path: str,
+                 secret_token: str, max_pending: int,
+                 backlog: Optional[Callable[[], int]] = None,
+                 stats_provider: Optional[Callable[[], Dict]] = None):
+        if not secret_token:
+            raise ValueError("WEBHOOK_SECRET_TOKEN is required in webhook mode")
+        self.application = application
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self.max_pending = max_pending
+        # Updates accepted but not finished beyond update_queue, which a concurrent processor empties at once
+        self.backlog = backlog
+        self.stats_provider = stats_provider  # Served as JSON on GET {path}/stats for sharded /stats
+        self._runner: Optional[web.AppRunner] = None
+        self.accepted = 0
+        self.rejected = 0  # Bad secret or malformed body
+        self.shed = 0  # Turned away with 503 while max_pending updates were unfinished, Telegram retries these
+
+    @property
+    def pending(self) -> int:
+        return self.application.update_queue.qsize() + (self.backlog() if self.backlog else 0)
+
+    def _authorized(self, request: web.Request) -> bool:
+        token = request.headers.get(SECRET_TOKEN_HEADER, "")
+        if hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            return True
+        self.rejected += 1
+        logger.warning(f"Webhook request from {request.remote} with a bad secret token")
+        return False
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            return web.Response(status=403)
+
+        if self.max_pending and self.pending >= self.max_pending:
+            self.shed += 1
+            return web.Response(status=503)
+
+        try:
+            update = Update.de_json(await request.json(), self.application.bot)
+        except Exception as e:
+            self.rejected += 1
+            logger.warning(f"Malformed webhook update: {e}")
+            return web.Response(status=400)
+        if update is None:
+            self.rejected += 1
+            return web.Response(status=400)
+
+        # Ack now, the application's update fetcher processes it in the background
+        self.application.update_queue.put_nowait(update)
+        self.accepted += 1
+        return web.Response()
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            return web.Response(status=403)
+        return web.json_response(self.stats_provider())
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        if self.stats_provider:
+            app.router.add_get(f"{self.path.rstrip('/')}/stats", self.handle_stats)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Webhook listening on http://{self.host}:{self.port}{self.path}")
+
+    async def stop(self) -> None:
+        """Stop accepting updates; unfinished ones are drained by application.stop()"""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+            logger.info(f"Webhook server closed with {self.pending} updates left to finish")
+
+    def stats(self) -> Dict:
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "shed": self.shed,
+            "pending": self.pending
+        }